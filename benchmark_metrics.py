@@ -8,11 +8,11 @@ class BenchmarkMetrics:
         self.results = []
         self.latencies = []
 
-    def record(self, prompt_id, prompt, label, verdict, blocked, latency, timestamp=None):
+    def record(self, prompt_id, prompt, label, verdict, blocked, latency, timestamp=None, spans=None):
         if timestamp is None:
             timestamp = datetime.now().isoformat()
             
-        self.results.append({
+        row = {
             "id": prompt_id,
             "timestamp": timestamp,
             "prompt": prompt[:120],
@@ -20,9 +20,25 @@ class BenchmarkMetrics:
             "verdict": verdict,      # "High-Risk", "Monitor", "Routine"
             "blocked": blocked,
             "latency_ms": round(latency * 1000, 2)
-        })
+        }
+        # Per-stage ms from the request trace, one column per stage (span_<stage>_ms)
+        for name, ms in (spans or {}).items():
+            row[f"span_{name}_ms"] = round(ms, 3)
+        self.results.append(row)
         self.latencies.append(latency)
 
+    def stage_breakdown(self):
+        """p50/p95 ms per traced stage, slowest p95 first. Requests that skipped a stage count as 0."""
+        stages = sorted({k for r in self.results for k in r if k.startswith("span_")})
+        breakdown = {}
+        for key in stages:
+            samples = sorted(r.get(key, 0.0) for r in self.results)
+            breakdown[key[5:-3]] = {
+                "p50": samples[len(samples) // 2],
+                "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            }
+        return dict(sorted(breakdown.items(), key=lambda kv: -kv[1]["p95"]))
+
     def summary(self):
         cm = defaultdict(int)
         for r in self.results:
@@ -52,6 +68,10 @@ class BenchmarkMetrics:
 
     def save_csv(self, filename="benchmark_results.csv"):
         if not self.results: return
+        # Stages vary per request, so the header is the union of every row's columns
+        fieldnames = list(self.results[0].keys())
+        for row in self.results:
+            fieldnames += [k for k in row if k not in fieldnames]
         with open(filename, "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=self.results[0].keys())
+            writer = csv.DictWriter(f, fieldnames=fieldnames, restval=0.0)
             writer.writeheader(); writer.writerows(self.results)
\ No newline at end of file
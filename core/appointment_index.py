@@ -0,0 +1,117 @@
+import bisect
+import itertools
+from datetime import date as Date, datetime
+
+try:
+    from core.state_journal import apply_op
+except ImportError:
+    from state_journal import apply_op
+
+END_OF_DAY = 24 * 60  # Sort key for appointments whose time does not parse
+
+
+def parse_when(date, time):
+    """The appointment's datetime, or None when date/time are not in a recognised format."""
+    if not isinstance(date, str) or not isinstance(time, str): return None
+    try:
+        return datetime.fromisoformat(f"{date}T{time}")
+    except ValueError:
+        pass
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d %I:%M %p", "%Y-%m-%d %I%p"):
+        try: return datetime.strptime(f"{date} {time.strip().upper()}", fmt)
+        except ValueError: continue
+    return None
+
+
+def iso_date(value):
+    """`value` (YYYY-MM-DD, YYYYMMDD as str or int, or a date) as an ISO date string, or None if it is not a date."""
+    if isinstance(value, datetime): value = value.date()
+    if isinstance(value, Date): return value.isoformat()
+    if isinstance(value, int) and not isinstance(value, bool): value = str(value)
+    if not isinstance(value, str): return None
+    for fmt in ("%Y-%m-%d", "%Y%m%d"):
+        try: return datetime.strptime(value.strip(), fmt).date().isoformat()
+        except ValueError: continue
+    return None
+
+
+class AppointmentIndex:
+    """
+    Appointments kept sorted by (date, time) with their datetimes parsed once.
+    Range queries bisect into the sorted keys, so they cost O(log n + k)
+    instead of a scan and sort of the whole list. Entries reference the
+    appointment dicts themselves; `apply()` keeps the index in step with every
+    journal op on the appointments list. Appointments without an ISO date
+    string are not indexed.
+    """
+    def __init__(self, appointments=(), key="appointments"):
+        self.key = key
+        self._seq = itertools.count()
+        self.rebuild(appointments)
+
+    def rebuild(self, appointments):
+        self._keys = []     # Sorted (date, minutes, seq)
+        self._entries = []  # (datetime or None, appointment), parallel to _keys
+        self._by_id = {}    # id(appointment) -> its key
+        for appt in appointments: self.add(appt)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, appt):
+        date = appt.get("date")
+        if not isinstance(date, str) or id(appt) in self._by_id: return
+        at = parse_when(date, appt.get("time"))
+        key = (date, at.hour * 60 + at.minute if at else END_OF_DAY, next(self._seq))
+        i = bisect.bisect_left(self._keys, key)
+        self._keys.insert(i, key)
+        self._entries.insert(i, (at, appt))
+        self._by_id[id(appt)] = key
+
+    def discard(self, appt):
+        key = self._by_id.pop(id(appt), None)
+        if key is None: return
+        i = bisect.bisect_left(self._keys, key)
+        del self._keys[i]
+        del self._entries[i]
+
+    def apply(self, data, op):
+        """apply_op() on `data`, updating the index for ops on the appointments list."""
+        if op["key"] != self.key:
+            return apply_op(data, op)
+        kind, items = op["op"], data.get(self.key, [])
+        if kind == "remove": gone = [items[i] for i in set(op["indices"])]
+        elif kind == "trim": gone = items[:op["count"]]
+        elif kind == "update": gone = [items[op["index"]]]
+        else: gone = []
+        for appt in gone: self.discard(appt)
+
+        apply_op(data, op)
+        items = data[self.key]
+        if kind == "set": self.rebuild(items)
+        elif kind == "append": self.add(items[-1])
+        elif kind == "extend":
+            for appt in items[len(items) - len(op["values"]):]: self.add(appt)
+        elif kind == "update": self.add(items[op["index"]])
+        elif kind == "insert":
+            for i, _ in op["items"]: self.add(items[i])
+
+    # --- QUERIES ---
+
+    def between(self, start_date, end_date):
+        """Appointments with start_date <= date <= end_date (ISO date strings), in (date, time) order."""
+        if not isinstance(start_date, str) or not isinstance(end_date, str): return []
+        lo = bisect.bisect_left(self._keys, (start_date,))
+        hi = bisect.bisect_left(self._keys, (end_date, END_OF_DAY + 1))
+        return [appt for _, appt in self._entries[lo:hi]]
+
+    def on(self, date):
+        return self.between(date, date)
+
+    def next_after(self, ts, until=None):
+        """(datetime, appointment) pairs strictly after `ts` (and before `until`), soonest first."""
+        i = bisect.bisect_left(self._keys, (ts.date().isoformat(), ts.hour * 60 + ts.minute))
+        for at, appt in self._entries[i:]:
+            if at is None: continue
+            if until is not None and at >= until: break
+            if at > ts: yield at, appt
@@ -0,0 +1,64 @@
+from collections import deque
+
+
+class ChangeLog:
+    """
+    Bounded record of which ID'd records changed at which state version, for
+    delta sync (/api/state/delta). Each entry is (version, key, id, kind) with
+    kind "upsert" or "delete". Ops that move records without ids in play (a
+    "set" of the whole list, or an undo "insert" at old positions) reset the key
+    instead, and its next delta carries the full list. Once entries fall out of
+    the buffer, deltas from before `floor` are answered with the full state.
+    """
+    def __init__(self, keys, capacity=2000):
+        self.keys = tuple(keys)
+        self.capacity = max(1, int(capacity))
+        self._entries = deque()
+        self._resets = {}  # key -> last version that needs a full list
+        self.floor = 0     # Deltas since an older version cannot be answered
+
+    def _add(self, version, key, record_id, kind):
+        if len(self._entries) >= self.capacity:
+            self.floor = self._entries.popleft()[0]
+        self._entries.append((version, key, record_id, kind))
+
+    def removed_ids(self, data, op):
+        """Ids an op is about to remove (call before applying it)."""
+        if op["key"] not in self.keys: return []
+        items = data.get(op["key"], [])
+        if op["op"] == "remove": return [items[i].get("id") for i in set(op["indices"])]
+        if op["op"] == "trim": return [item.get("id") for item in items[:op["count"]]]
+        if op["op"] == "update" and "id" in op["fields"]: return [items[op["index"]].get("id")]
+        return []
+
+    def record(self, version, data, op, removed=()):
+        """Notes what `op` (already applied to `data`) changed."""
+        key, kind = op["key"], op["op"]
+        if key not in self.keys: return
+        for record_id in removed:
+            if record_id is not None: self._add(version, key, record_id, "delete")
+        items = data.get(key, [])
+        if kind in ("set", "insert"): self.reset(version, key)
+        elif kind == "append": self._add(version, key, items[-1].get("id"), "upsert")
+        elif kind == "extend":
+            for item in items[len(items) - len(op["values"]):]: self._add(version, key, item.get("id"), "upsert")
+        elif kind == "update": self._add(version, key, items[op["index"]].get("id"), "upsert")
+
+    def reset(self, version, key):
+        self._resets[key] = version
+
+    def since(self, version, key):
+        """
+        (upserted ids, deleted ids) for `key` after `version`, latest change per id,
+        or None when the caller needs the full list.
+        """
+        if version < self.floor or self._resets.get(key, 0) > version: return None
+        latest = {}
+        for v, k, record_id, kind in reversed(self._entries):
+            if v <= version: break
+            if k == key and record_id is not None and record_id not in latest: latest[record_id] = kind
+        return ([i for i, kind in latest.items() if kind == "upsert"],
+                [i for i, kind in latest.items() if kind == "delete"])
+
+    def stats(self):
+        return {"entries": len(self._entries), "capacity": self.capacity, "floor": self.floor}
@@ -0,0 +1,119 @@
+import time
+import threading
+from datetime import datetime
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for a slow or unreliable dependency.
+    After `failure_threshold` failures in a row the circuit opens and calls fail
+    fast with CircuitOpenError. A background thread then runs `probe()` every
+    `probe_interval` seconds and closes the circuit on the first success.
+    Without a probe, the first call after `probe_interval` is let through as a trial.
+    """
+    def __init__(self, name, failure_threshold=3, probe=None, probe_interval=10.0, on_open=None, on_close=None):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.probe = probe
+        self.probe_interval = max(0.1, float(probe_interval))
+        self.on_open = on_open
+        self.on_close = on_close
+        self._lock = threading.Lock()
+        self._probe_thread = None
+
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.short_circuited = 0
+        self.trips = 0
+        self.last_error = None
+        self.last_probe_at = None
+
+    @property
+    def is_open(self):
+        return self.state == "open"
+
+    def call(self, fn, *args, **kwargs):
+        with self._lock:
+            if self.state == "open":
+                trial = self.probe is None and time.time() - self.opened_at >= self.probe_interval
+                if not trial:
+                    self.short_circuited += 1
+                    raise CircuitOpenError(f"{self.name} circuit open ({self.last_error})")
+                self.opened_at = time.time()  # One trial per interval
+            self.calls += 1
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success()
+        return result
+
+    def record_success(self):
+        with self._lock:
+            was_open = self.state == "open"
+            self.consecutive_failures = 0
+            self.state = "closed"
+            self.opened_at = None
+        if was_open:
+            print(f"✅ {self.name} circuit closed - dependency recovered")
+            if self.on_close: self.on_close()
+
+    def record_failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if "timeout" in type(error).__name__.lower() or "timed out" in str(error).lower():
+                self.timeouts += 1
+            self.last_error = f"{type(error).__name__}: {error}"[:200]
+            tripped = self.state == "closed" and self.consecutive_failures >= self.failure_threshold
+            if tripped:
+                self.state = "open"
+                self.opened_at = time.time()
+                self.trips += 1
+        if tripped:
+            print(f"⚡ {self.name} circuit OPEN after {self.consecutive_failures} failures ({self.last_error})")
+            if self.on_open: self.on_open()
+            self._start_probe()
+
+    def _start_probe(self):
+        if self.probe is None or (self._probe_thread and self._probe_thread.is_alive()): return
+        self._probe_thread = threading.Thread(target=self._probe_loop, name=f"{self.name}-probe", daemon=True)
+        self._probe_thread.start()
+
+    def _probe_loop(self):
+        while self.state == "open":
+            time.sleep(self.probe_interval)
+            self.last_probe_at = time.time()
+            try:
+                self.probe()
+            except Exception as e:
+                with self._lock:
+                    self.last_error = f"{type(e).__name__}: {e}"[:200]
+                continue
+            self.record_success()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "calls": self.calls,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "short_circuited": self.short_circuited,
+                "trips": self.trips,
+                "last_error": self.last_error,
+                "opened_at": datetime.fromtimestamp(self.opened_at).isoformat() if self.opened_at else None,
+                "last_probe_at": datetime.fromtimestamp(self.last_probe_at).isoformat() if self.last_probe_at else None
+            }
@@ -0,0 +1,153 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache for the forensic engines.
+    Tier 1 is an in-process LRU, tier 2 is a size-bounded SQLite file that
+    survives restarts. Entries are keyed by model name + NFKC-normalized text.
+    """
+    def __init__(self, path=None, memory_entries=2048, disk_entries=20000):
+        self.memory_entries = max(0, int(memory_entries))
+        self.disk_entries = max(0, int(disk_entries))
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._clock = 0
+        self._disk_count = 0
+
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if path and self.disk_entries:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings ("
+                    " key TEXT PRIMARY KEY, model TEXT, dims INTEGER,"
+                    " vector BLOB, last_used INTEGER)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+                self._db.commit()
+                row = self._db.execute("SELECT MAX(last_used), COUNT(*) FROM embeddings").fetchone()
+                self._clock, self._disk_count = row[0] or 0, row[1]
+            except sqlite3.Error as e:
+                print(f"⚠️ Embedding cache disk tier disabled ({e})")
+                self._db = None
+
+    @staticmethod
+    def normalize(text):
+        return unicodedata.normalize('NFKC', text)
+
+    @staticmethod
+    def key(model, text):
+        return hashlib.sha1(f"{model}\0{text}".encode('utf-8')).hexdigest()
+
+    def get(self, model, text):
+        """Returns the cached vector or None. `text` must already be normalized."""
+        k = self.key(model, text)
+        with self._lock:
+            vec = self._memory.get(k)
+            if vec is not None:
+                self._memory.move_to_end(k)
+                self.hits += 1; self.memory_hits += 1
+                return vec
+
+            if self._db is not None:
+                row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (k,)).fetchone()
+                if row:
+                    vec = np.frombuffer(row[0], dtype=np.float32)
+                    self._clock += 1
+                    self._db.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (self._clock, k))
+                    self._db.commit()
+                    self._remember(k, vec)
+                    self.hits += 1; self.disk_hits += 1
+                    return vec
+
+            self.misses += 1
+            return None
+
+    def put(self, model, text, vector):
+        k = self.key(model, text)
+        vec = np.asarray(vector, dtype=np.float32)
+        vec.setflags(write=False)
+        with self._lock:
+            self._remember(k, vec)
+            if self._db is not None:
+                self._clock += 1
+                cur = self._db.execute(
+                    "INSERT OR IGNORE INTO embeddings (key, model, dims, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (k, model, vec.shape[0], vec.tobytes(), self._clock)
+                )
+                if cur.rowcount:
+                    self._disk_count += 1
+                else:
+                    self._db.execute(
+                        "UPDATE embeddings SET vector = ?, dims = ?, last_used = ? WHERE key = ?",
+                        (vec.tobytes(), vec.shape[0], self._clock, k)
+                    )
+                self._evict_disk()
+                self._db.commit()
+        return vec
+
+    def get_or_compute(self, model, text, compute):
+        """
+        Returns the embedding for `text`, calling `compute(normalized_text)` on a miss.
+        The vector is computed from the normalized text so every variant that
+        folds to the same key maps to the same embedding.
+        """
+        text = self.normalize(text)
+        vec = self.get(model, text)
+        if vec is None:
+            vec = self.put(model, text, compute(text))
+        return vec
+
+    def _remember(self, k, vec):
+        if not self.memory_entries: return
+        self._memory[k] = vec
+        self._memory.move_to_end(k)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _evict_disk(self):
+        if self._disk_count <= self.disk_entries: return
+        # Trim to 90% in one statement so eviction cost is amortized across inserts
+        excess = self._disk_count - int(self.disk_entries * 0.9)
+        self._db.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,)
+        )
+        self._disk_count -= excess
+        self.evictions += excess
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_size": len(self._memory),
+                "disk_size": self._disk_count if self._db is not None else 0
+            }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,104 @@
+import zlib
+
+import numpy as np
+
+# Ollama is only needed by the remote backend
+try:
+    import ollama
+except ImportError:
+    ollama = None
+
+
+class EmbeddingBackend:
+    """
+    Interface for the forensic engine's text embedders.
+    `model_id` keys the embedding cache and the exemplar index fingerprint, so
+    vectors from different backends or settings never mix.
+    """
+    name = "base"
+    remote = False  # Remote backends get the disk cache and the circuit breaker probe
+
+    @property
+    def model_id(self):
+        return self.name
+
+    def embed(self, text):
+        raise NotImplementedError
+
+    def embed_many(self, texts):
+        return [self.embed(t) for t in texts]
+
+    def probe(self):
+        """Cheap liveness check used by the circuit breaker."""
+        self.embed("ping")
+
+
+class OllamaEmbeddingBackend(EmbeddingBackend):
+    """Embeddings from a local Ollama server, with a per-call deadline."""
+    name = "ollama"
+    remote = True
+
+    def __init__(self, model="llama3.1:8b", host="http://localhost:11434", timeout=2.0):
+        if ollama is None:
+            raise ImportError("ollama package not installed (pip install ollama)")
+        self.model = model
+        self.timeout = timeout
+        self.client = ollama.Client(host=host, timeout=timeout)
+
+    @property
+    def model_id(self):
+        return self.model
+
+    def embed(self, text):
+        return self.client.embeddings(model=self.model, prompt=text)['embedding']
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Deterministic pure-NumPy embedder for CPU-only runs.
+    Character n-grams of the lowercased, space-padded text are hashed (CRC32,
+    stable across processes) into `dims` signed buckets with sublinear term
+    frequency. Vectors are reproducible, need no model server and cost tens
+    of microseconds per prompt.
+    """
+    name = "hashing"
+
+    def __init__(self, dims=512, ngram_range=(3, 5)):
+        self.dims = int(dims)
+        self.ngram_min, self.ngram_max = (int(n) for n in ngram_range)
+
+    @property
+    def model_id(self):
+        return f"hashing-{self.dims}-{self.ngram_min}-{self.ngram_max}"
+
+    def embed(self, text):
+        padded = f" {' '.join(text.lower().split())} "
+        grams = {}
+        for n in range(self.ngram_min, self.ngram_max + 1):
+            for i in range(len(padded) - n + 1):
+                gram = padded[i:i + n]
+                grams[gram] = grams.get(gram, 0) + 1
+        if not grams:
+            return np.zeros(self.dims, dtype=np.float32)
+
+        hashes = np.fromiter((zlib.crc32(g.encode('utf-8')) for g in grams), dtype=np.uint32, count=len(grams))
+        weights = np.log1p(np.fromiter(grams.values(), dtype=np.float32, count=len(grams)))
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        vec = np.bincount(hashes % self.dims, weights=weights * signs, minlength=self.dims).astype(np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+
+BACKENDS = {"ollama": OllamaEmbeddingBackend, "hashing": HashingEmbeddingBackend}
+
+
+def build_backend(cfg, model="llama3.1:8b", host="http://localhost:11434", timeout=2.0):
+    """Creates the backend named by the `embedding_backend` config block."""
+    cfg = cfg or {}
+    kind = cfg.get("type", "ollama")
+    if kind == "hashing":
+        opts = cfg.get("hashing", {}) or {}
+        return HashingEmbeddingBackend(dims=opts.get("dims", 512), ngram_range=opts.get("ngram_range", (3, 5)))
+    if kind == "ollama":
+        return OllamaEmbeddingBackend(model=model, host=host, timeout=timeout)
+    raise ValueError(f"Unknown embedding backend: {kind} (expected one of {', '.join(BACKENDS)})")
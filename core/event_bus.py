@@ -0,0 +1,90 @@
+import json
+import time
+import uuid
+import threading
+from collections import deque
+from itertools import islice
+
+
+class EventBus:
+    """
+    In-process publish/subscribe for the /api/events SSE stream.
+    Events get increasing ids "<epoch>:<n>" and the last `capacity` are kept,
+    so a reconnecting client (EventSource sends Last-Event-ID) is replayed
+    exactly what it missed. When its id is from another run or already fell
+    out of the buffer, it is sent a "reset" event and should reload in full.
+    """
+    def __init__(self, capacity=500, heartbeat=15.0):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.capacity = max(1, int(capacity))
+        self.heartbeat = heartbeat
+        self._events = deque(maxlen=self.capacity)  # (n, type, data)
+        self._next = 1
+        self._cond = threading.Condition()
+        self._closed = False
+        self.published = 0
+        self.subscribers = 0
+
+    def publish(self, event_type, data):
+        with self._cond:
+            self._events.append((self._next, event_type, data))
+            self._next += 1
+            self.published += 1
+            self._cond.notify_all()
+
+    def _parse(self, last_event_id):
+        """Sequence number to resume after, or None when the client must reset."""
+        if not last_event_id: return self._next - 1
+        epoch, _, n = last_event_id.partition(":")
+        if epoch != self.epoch or not n.isdigit(): return None
+        n = int(n)
+        oldest = self._events[0][0] if self._events else self._next
+        return n if oldest - 1 <= n < self._next else None
+
+    def _format(self, n, event_type, data):
+        return f"id: {self.epoch}:{n}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+    def stream(self, last_event_id=None):
+        """Generator of SSE-formatted events after `last_event_id`, with heartbeat comments."""
+        reset = None
+        with self._cond:
+            cursor = self._parse(last_event_id)
+            if cursor is None:
+                cursor = self._next - 1
+                reset = self._format(cursor, "reset", {"reason": "replay unavailable"})
+            self.subscribers += 1
+        try:
+            # Frames are only ever yielded with the lock released: a slow client must not hold up publish()
+            if reset: yield reset
+            while True:
+                with self._cond:
+                    deadline = time.monotonic() + self.heartbeat
+                    while not self._closed and cursor >= self._next - 1:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0: break
+                        self._cond.wait(remaining)
+                    if self._closed: return
+                    oldest = self._events[0][0] if self._events else self._next
+                    if cursor < oldest - 1:
+                        # Too slow a reader: events were dropped, so it has to resync
+                        cursor = self._next - 1
+                        pending = [self._format(cursor, "reset", {"reason": "fell behind"})]
+                    else:
+                        pending = [self._format(*e) for e in islice(self._events, cursor - oldest + 1, None)]
+                        if pending: cursor = self._events[-1][0]
+                if pending:
+                    yield "".join(pending)
+                else:
+                    yield ": keepalive\n\n"
+        finally:
+            with self._cond: self.subscribers -= 1
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {"epoch": self.epoch, "published": self.published, "buffered": len(self._events),
+                    "capacity": self.capacity, "subscribers": self.subscribers}
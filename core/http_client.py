@@ -0,0 +1,244 @@
+import ssl
+import time
+import random
+import threading
+import http.client
+from collections import deque
+from urllib.parse import urlsplit
+
+try:
+    from core.tracing import percentile
+except ImportError:
+    from tracing import percentile
+
+RETRY_STATUSES = (429, 502, 503, 504)
+# Safe to send twice; anything else (e.g. a POST) is retried only when the caller opts in
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+# A reused keep-alive socket the server has already closed fails like this before any reply
+STALE_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError, ConnectionAbortedError)
+
+
+class HTTPStatusError(IOError):
+    """Raised for a 4xx/5xx reply (after retries)."""
+    def __init__(self, code, reason, body=b"", url=""):
+        super().__init__(f"HTTP {code} {reason} ({url})")
+        self.code = code
+        self.reason = reason
+        self.body = body
+        self.url = url
+
+
+class HostPool:
+    """Idle keep-alive connections to one scheme://host:port, plus that host's metrics."""
+    def __init__(self, scheme, host, port, max_idle=4, idle_timeout=30.0, ssl_context=None):
+        self.scheme, self.host, self.port = scheme, host, port
+        self.max_idle = max(0, int(max_idle))
+        self.idle_timeout = idle_timeout
+        self.ssl_context = ssl_context
+        self._lock = threading.Lock()
+        self._idle = []  # (connection, returned_at), most recent last
+
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.opened = 0
+        self.reused = 0
+        self.latencies = deque(maxlen=256)  # Time to response headers (ms)
+
+    def acquire(self, timeout):
+        """(connection, reused): the most recently returned live connection, or a new one."""
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                conn, returned_at = self._idle.pop()
+                if now - returned_at < self.idle_timeout:
+                    self.reused += 1
+                    conn.timeout = timeout
+                    if conn.sock is not None: conn.sock.settimeout(timeout)
+                    return conn, True
+                conn.close()
+            self.opened += 1
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=timeout, context=self.ssl_context), False
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout), False
+
+    def release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle: conn.close()
+
+    def record(self, latency_ms=None, error=False, retry=False):
+        with self._lock:
+            if latency_ms is not None:
+                self.requests += 1
+                self.latencies.append(latency_ms)
+            if error: self.errors += 1
+            if retry: self.retries += 1
+
+    def stats(self):
+        with self._lock:
+            samples = list(self.latencies)
+            return {"requests": self.requests, "errors": self.errors, "retries": self.retries,
+                    "connections_opened": self.opened, "connections_reused": self.reused, "idle": len(self._idle),
+                    "latency_ms": {"p50": round(percentile(samples, 0.50), 2), "p95": round(percentile(samples, 0.95), 2),
+                                   "max": round(max(samples), 2) if samples else 0.0}}
+
+
+class PooledResponse:
+    """
+    A reply whose connection goes back to its pool once the body has been read
+    to the end. Closing it earlier (e.g. abandoning a stream) closes the
+    connection instead, which also tells the server to stop sending.
+    """
+    def __init__(self, pool, conn, response):
+        self._pool, self._conn, self._response = pool, conn, response
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+
+    def getcode(self):
+        return self.status
+
+    def read(self):
+        try:
+            return self._response.read()
+        finally:
+            self.close()
+
+    def __iter__(self):
+        """The body line by line (NDJSON streams)."""
+        try:
+            for line in self._response:
+                yield line
+        finally:
+            self.close()
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is None: return
+        if self._response.isclosed() and not self._response.will_close:
+            self._pool.release(conn)
+        else:
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class HTTPClient:
+    """
+    Shared HTTP client with per-host keep-alive pools, so repeat calls to
+    Ollama, ntfy.sh or wttr.in skip TCP/TLS setup. Failed connections and
+    429/502/503/504 replies of idempotent requests are retried up to `retries`
+    times with full jitter backoff (a random wait up to backoff * 2^attempt,
+    capped at backoff_max). A stale pooled connection is replaced at once
+    without using a retry. `timeouts` maps a service name to its timeout for
+    `timeout()`.
+    """
+    def __init__(self, max_idle=4, idle_timeout=30.0, retries=2, backoff=0.25, backoff_max=4.0,
+                 timeout=10.0, timeouts=None):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.retries = max(0, int(retries))
+        self.backoff = max(0.0, float(backoff))
+        self.backoff_max = max(self.backoff, float(backoff_max))
+        self.default_timeout = timeout
+        self.timeouts = dict(timeouts or {})
+        self._ssl_context = ssl.create_default_context()
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    def timeout(self, service, default=None):
+        return self.timeouts.get(service, default if default is not None else self.default_timeout)
+
+    def _pool(self, scheme, host, port):
+        key = f"{scheme}://{host}:{port}"
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = HostPool(scheme, host, port, self.max_idle, self.idle_timeout, self._ssl_context)
+            return pool
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+
+    def request(self, method, url, body=None, headers=None, timeout=None, retries=None, idempotent=None):
+        """
+        Sends the request and returns a PooledResponse once the headers arrive
+        (use it as a context manager, or read() it). Raises HTTPStatusError for
+        4xx/5xx and OSError (ConnectionError, TimeoutError...) when the host
+        cannot be reached.
+
+        Only IDEMPOTENT_METHODS are retried unless `idempotent=True`: a POST
+        the server may already have acted on (a push notification) is sent
+        once. Its stale pooled connection is still replaced, but only when the
+        request could not be sent at all.
+        """
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        pool = self._pool(scheme, parts.hostname, parts.port or (443 if scheme == "https" else 80))
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        timeout = timeout if timeout is not None else self.default_timeout
+        if idempotent is None: idempotent = method.upper() in IDEMPOTENT_METHODS
+        retries = (self.retries if retries is None else retries) if idempotent else 0
+        headers = headers or {}
+
+        attempt = 0
+        while True:
+            conn, reused = pool.acquire(timeout)
+            start = time.perf_counter()
+            sent = False
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                sent = True
+                response = conn.getresponse()
+            except Exception as e:
+                conn.close()
+                # Server dropped the idle connection; a sent non-idempotent request may have arrived
+                if reused and isinstance(e, STALE_ERRORS) and (idempotent or not sent): continue
+                pool.record(error=True)
+                # A timeout means the host is up but slow; retrying would multiply the wait
+                if isinstance(e, TimeoutError) or not isinstance(e, OSError) or attempt >= retries: raise
+                pool.record(retry=True)
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+
+            pool.record(latency_ms=(time.perf_counter() - start) * 1000)
+            reply = PooledResponse(pool, conn, response)
+            if response.status < 400: return reply
+            data = reply.read()
+            pool.record(error=True)
+            if response.status in RETRY_STATUSES and attempt < retries:
+                pool.record(retry=True)
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            raise HTTPStatusError(response.status, response.reason, data, url)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, body=None, **kwargs):
+        return self.request("POST", url, body=body, **kwargs)
+
+    def stats(self):
+        """Per-host request counts, retries, connection reuse and latency (time to headers)."""
+        with self._lock:
+            pools = dict(self._pools)
+        return {key: pool.stats() for key, pool in pools.items()}
+
+    def close(self):
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools: pool.close()
@@ -0,0 +1,121 @@
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+try:
+    from core.rule_engine import Rule, RuleEngine, REGEX_META
+except ImportError:
+    from rule_engine import Rule, RuleEngine, REGEX_META
+
+
+@dataclass
+class IntentMatch:
+    """Outcome of one routing scan: the winning skill (if any) plus what fired."""
+    skill: Optional[str] = None
+    trigger: int = -1
+    matched: List[str] = field(default_factory=list)
+    flags: set = field(default_factory=set)
+
+    def __bool__(self):
+        return self.skill is not None
+
+
+class IntentIndex:
+    """
+    Router-level intent matcher. Skills declare their triggers as data
+    (`TRIGGERS`); every trigger condition across all skills is compiled into
+    one RuleEngine and evaluated in a single scan per request, so routing
+    cost tracks text length rather than the number of skills.
+
+    A trigger is a dict whose conditions must all hold; a skill matches if
+    any of its triggers does:
+      contains        - any of these substrings (lowercased text)
+      and_contains    - and also any of these substrings
+      regex           - pattern searched on the lowercased text
+      equals          - stripped, lowercased text equals one of these
+      unless_contains - none of these substrings
+      unless_regex    - pattern must not match
+      focus           - state.last_focus must equal this value
+    Skills without TRIGGERS fall back to calling their own match().
+    """
+    CONDITIONS = ("contains", "and_contains", "regex", "equals", "unless_contains", "unless_regex")
+
+    def __init__(self, skills: Dict[str, Any], router_triggers: Dict[str, Dict] = None, state=None):
+        self.state = state
+        self.order = []        # (skill name, [trigger dicts] or None for match() fallback)
+        self.fallback = {}
+        rules = []
+        for name, skill in skills.items():
+            triggers = getattr(skill, "TRIGGERS", None)
+            if triggers is None:
+                self.order.append((name, None))
+                self.fallback[name] = skill
+                continue
+            self.order.append((name, list(triggers)))
+            for i, trigger in enumerate(triggers):
+                rules += self._compile(f"{name}:{i}", trigger)
+
+        self.router_triggers = dict(router_triggers or {})
+        for flag, trigger in self.router_triggers.items():
+            rules += self._compile(f"router:{flag}", trigger)
+        self.engine = RuleEngine(rules)
+
+    @staticmethod
+    def _literal_rule(owner, key, literal, target="lower"):
+        pattern = re.escape(literal) if any(c in REGEX_META for c in literal) else literal
+        return Rule(name=literal, pattern=pattern, category=f"{owner}:{key}", target=target)
+
+    def _compile(self, owner, trigger):
+        unknown = set(trigger) - set(self.CONDITIONS) - {"focus"}
+        if unknown:
+            raise ValueError(f"Unknown trigger condition(s) {sorted(unknown)} in {owner}")
+        rules = []
+        for key in ("contains", "and_contains", "unless_contains"):
+            rules += [self._literal_rule(owner, key, lit) for lit in trigger.get(key, [])]
+        for key in ("regex", "unless_regex"):
+            if key in trigger:
+                rules.append(Rule(name=trigger[key], pattern=trigger[key], category=f"{owner}:{key}", target="lower"))
+        if "equals" in trigger:
+            alternatives = "|".join(re.escape(v) for v in trigger["equals"])
+            rules.append(Rule(name="equals", pattern=f"^(?:{alternatives})\\Z", category=f"{owner}:equals", target="stripped"))
+        return rules
+
+    def _holds(self, owner, trigger, fired, state):
+        for key in ("contains", "and_contains", "regex", "equals"):
+            if key in trigger and f"{owner}:{key}" not in fired: return False
+        for key in ("unless_contains", "unless_regex"):
+            if key in trigger and f"{owner}:{key}" in fired: return False
+        if "focus" in trigger and getattr(state, "last_focus", None) != trigger["focus"]: return False
+        return True
+
+    def match(self, text: str, state=None) -> IntentMatch:
+        """One scan over the text; returns the first matching skill in registration order."""
+        state = state if state is not None else self.state
+        low = text.lower()
+        hits = self.engine.scan({"lower": low, "stripped": low.strip()})
+        fired = {}
+        for hit in hits:
+            fired.setdefault(hit.rule.category, []).append(hit.rule.name)
+
+        result = IntentMatch(flags={f for f, t in self.router_triggers.items() if self._holds(f"router:{f}", t, fired, state)})
+        for name, triggers in self.order:
+            if triggers is None:
+                if self.fallback[name].match(text):
+                    result.skill = name
+                    return result
+                continue
+            for i, trigger in enumerate(triggers):
+                owner = f"{name}:{i}"
+                if self._holds(owner, trigger, fired, state):
+                    result.skill, result.trigger = name, i
+                    result.matched = [n for key in self.CONDITIONS[:4] for n in fired.get(f"{owner}:{key}", [])]
+                    return result
+        return result
+
+    @classmethod
+    def matches(cls, skill, text: str) -> bool:
+        """Single-skill check backing each skill's match(); compiled once per skill instance."""
+        index = skill.__dict__.get("_intent_index")
+        if index is None:
+            index = skill._intent_index = cls({"skill": skill}, state=getattr(skill, "state", None))
+        return bool(index.match(text))
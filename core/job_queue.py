@@ -0,0 +1,200 @@
+import time
+import uuid
+import queue
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+try:
+    from core.tracing import span, percentile
+except ImportError:
+    from tracing import span, percentile
+
+
+class QueueFullError(RuntimeError):
+    """Raised by JobQueue.submit when the admission queue is at capacity."""
+
+
+class QueueClosedError(RuntimeError):
+    """Raised by JobQueue.submit after shutdown."""
+
+
+@dataclass
+class Job:
+    """One queued command and, once run, its result."""
+    payload: Any
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    status: str = "queued"  # queued | running | done | failed
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+    _done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def wait(self, timeout=None) -> bool:
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "queued_ms": round(((self.started_at or time.time()) - self.submitted_at) * 1000, 1),
+        }
+        if self.finished_at: data["run_ms"] = round((self.finished_at - self.started_at) * 1000, 1)
+        if self.status == "done":
+            data["result"] = self.result.to_dict() if hasattr(self.result, "to_dict") else self.result
+        if self.error: data["error"] = self.error
+        return data
+
+
+class StageLimiter:
+    """
+    Caps how many requests run one pipeline stage at once (e.g. security
+    screening vs. the LLM call). Used as a context manager; records how long
+    callers waited for a slot (also traced as span "<name>.wait").
+    """
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = max(1, int(limit))
+        self._slots = threading.BoundedSemaphore(self.limit)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self.entered = 0
+        self.waits = deque(maxlen=500)
+
+    def __enter__(self):
+        start = time.perf_counter()
+        with self._lock: self.waiting += 1
+        with span(f"{self.name}.wait"):
+            self._slots.acquire()
+        with self._lock:
+            self.waiting -= 1
+            self.active += 1
+            self.entered += 1
+            self.waits.append(time.perf_counter() - start)
+        return self
+
+    def __exit__(self, *exc):
+        with self._lock: self.active -= 1
+        self._slots.release()
+        return False
+
+    def stats(self):
+        with self._lock:
+            waits = list(self.waits)
+            return {
+                "limit": self.limit,
+                "active": self.active,
+                "waiting": self.waiting,
+                "entered": self.entered,
+                "wait_ms_avg": round(sum(waits) / len(waits) * 1000, 2) if waits else 0.0,
+                "wait_ms_p95": round(percentile(waits, 0.95) * 1000, 2)
+            }
+
+
+class JobQueue:
+    """
+    Fixed pool of worker threads behind a bounded admission queue.
+    `submit` never blocks: when `max_queue` jobs are already waiting it raises
+    QueueFullError so the caller can shed load. Finished jobs are kept (up to
+    `keep`) so clients can poll for their result by job ID.
+    """
+    def __init__(self, handler: Callable[[Job], Any], workers=4, max_queue=32, keep=256, name="jobs"):
+        self.handler = handler
+        self.name = name
+        self.workers = max(1, int(workers))
+        self.max_queue = max(1, int(max_queue))
+        self.keep = max(self.max_queue + self.workers, int(keep))
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.waits = deque(maxlen=500)
+        self.run_times = deque(maxlen=500)
+
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"{name}-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads: t.start()
+
+    def submit(self, payload, job_id=None) -> Job:
+        job = Job(payload) if job_id is None else Job(payload, id=job_id)
+        with self._lock:
+            if self._closed: raise QueueClosedError(f"{self.name} queue is shut down")
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self.rejected += 1
+                raise QueueFullError(f"{self.name} queue full ({self.max_queue} waiting)")
+            self.submitted += 1
+            self._jobs[job.id] = job
+            # Forget the oldest finished jobs; queued and running ones are always kept
+            while len(self._jobs) > self.keep:
+                oldest = next(iter(self._jobs.values()))
+                if oldest.status in ("queued", "running"): break
+                self._jobs.popitem(last=False)
+        return job
+
+    def get(self, job_id) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None: return
+            with self._lock:
+                self.running += 1
+                job.status, job.started_at = "running", time.time()
+                self.waits.append(job.started_at - job.submitted_at)
+            try:
+                job.result = self.handler(job)
+                job.status = "done"
+            except Exception as e:
+                job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+                print(f"❌ {self.name} job {job.id} failed: {job.error}")
+            finally:
+                job.finished_at = time.time()
+                with self._lock:
+                    self.running -= 1
+                    if job.status == "done": self.completed += 1
+                    else: self.failed += 1
+                    self.run_times.append(job.finished_at - job.started_at)
+                job._done.set()
+                self._queue.task_done()
+
+    def close(self, wait=False):
+        """Stops accepting jobs; workers exit once the queue drains."""
+        with self._lock:
+            if self._closed: return
+            self._closed = True
+        for _ in self._threads: self._queue.put(None)
+        if wait:
+            for t in self._threads: t.join()
+
+    def stats(self):
+        with self._lock:
+            waits, runs = list(self.waits), list(self.run_times)
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queue_depth": self._queue.qsize(),
+                "running": self.running,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "wait_ms_avg": round(sum(waits) / len(waits) * 1000, 2) if waits else 0.0,
+                "wait_ms_p95": round(percentile(waits, 0.95) * 1000, 2),
+                "run_ms_p95": round(percentile(runs, 0.95) * 1000, 2)
+            }
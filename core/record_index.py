@@ -0,0 +1,63 @@
+import uuid
+
+
+def new_record_id():
+    return str(uuid.uuid4())[:8]
+
+
+class RecordIndex:
+    """
+    Hash index from record "id" to list position for one list field
+    (tasks, appointments). Appends extend the index in O(1); a remove, insert
+    or trim only lowers a watermark, since positions before the first changed
+    slot are still exact. A lookup is O(1) when the cached position still holds
+    the record (always checked against its "id") and otherwise re-indexes the
+    suffix after the watermark, so direct edits to the list can never return a
+    wrong record.
+    """
+    def __init__(self, get_items):
+        self._get_items = get_items   # Callable: the list may be replaced by a "set" op
+        self._pos = {}
+        self._valid = 0               # Positions below this are known to be exact
+
+    def _reindex(self, start):
+        items = self._get_items()
+        for i in range(start, len(items)):
+            record_id = items[i].get("id")
+            if record_id is not None: self._pos[record_id] = i
+        self._valid = len(items)
+
+    def position(self, record_id):
+        """Current list position of the record with this id, or None."""
+        items = self._get_items()
+        i = self._pos.get(record_id)
+        if i is not None and i < len(items) and items[i].get("id") == record_id: return i
+        if self._valid < len(items):
+            self._reindex(self._valid)
+        elif i is not None:
+            # A stale entry below the watermark: the list was edited directly (or the id removed)
+            self._pos.clear()
+            self._reindex(0)
+        else:
+            return None
+        i = self._pos.get(record_id)
+        return i if i is not None and i < len(items) and items[i].get("id") == record_id else None
+
+    def positions(self, record_ids):
+        """{id: position} for the ids that exist."""
+        found = {}
+        for record_id in record_ids:
+            i = self.position(record_id)
+            if i is not None: found[record_id] = i
+        return found
+
+    def after_op(self, op, old_len):
+        """Keeps the index current after a journal op on its list (`old_len` is the length before it)."""
+        kind = op["op"]
+        if kind in ("append", "extend"):
+            if self._valid == old_len: self._reindex(old_len)
+        elif kind == "update":
+            if "id" in op["fields"]: self._valid = min(self._valid, op["index"])
+        elif kind == "remove": self._valid = min([self._valid] + list(op["indices"]))
+        elif kind == "insert": self._valid = min([self._valid] + [i for i, _ in op["items"]])
+        elif kind in ("trim", "set"): self._valid = 0
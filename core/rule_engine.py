@@ -0,0 +1,293 @@
+import re
+import time
+from collections import deque
+from dataclasses import dataclass, fields
+from typing import Dict, List
+
+# Optional C implementation of the literal automaton (pip install pyahocorasick)
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Regex engine with native match timeouts (pip install regex); rule budgets need it
+try:
+    import regex as timed_re
+except ImportError:
+    timed_re = None
+
+REGEX_META = set(".^$*+?{}[]\\|()")
+# Assertions on the surrounding text, which a window edge would fake
+ANCHORS = {"^", "$", "\\A", "\\b", "\\B", "\\Z", "\\z", "\\G"}
+
+
+def is_anchored(pattern):
+    """True if the pattern uses ^, $, \\b and friends or lookaround outside a character class."""
+    tokens = re.findall(r"\\.|\[\^?\]?(?:\\.|[^\]\\])*\]|[\^$]|\(\?<?[=!]", pattern)
+    return any(t in ANCHORS or t.startswith("(?") for t in tokens)
+
+
+@dataclass
+class Rule:
+    """A single screening rule. `target` names the text view it is evaluated against."""
+    name: str
+    pattern: str
+    weight: float = 0.5
+    category: str = ""
+    target: str = "lower"
+    reason: str = ""
+    min_length: int = 0
+
+    @property
+    def is_literal(self):
+        return not any(c in REGEX_META for c in self.pattern)
+
+
+@dataclass
+class ScreeningLimits:
+    """
+    Bounds on screening work per input (`security.screening` in config.yaml).
+    Regex rules run over windows of `chunk_size` characters overlapping by
+    `chunk_overlap`, so a match never spans more than one window. Anchored rules
+    (^, $, \\b, lookaround) scan the whole input, which max_input_length caps.
+    `rule_budget_ms` needs the `regex` package and is disabled without it.
+    """
+    max_input_length: int = 100000
+    chunk_size: int = 4096
+    chunk_overlap: int = 256
+    max_decode_attempts: int = 64
+    max_decode_length: int = 65536
+    rule_budget_ms: float = 50.0
+
+    @classmethod
+    def from_dict(cls, cfg):
+        cfg = cfg or {}
+        limits = cls(**{f.name: type(f.default)(cfg[f.name]) for f in fields(cls) if cfg.get(f.name) is not None})
+        limits.chunk_overlap = max(0, min(limits.chunk_overlap, limits.chunk_size // 2))
+        if limits.rule_budget_ms and timed_re is None:
+            # The stdlib engine cannot stop a backtracking match, so a budget would only be a hope
+            print("⚠️ rule_budget_ms needs the `regex` package (pip install regex) - screening budget disabled")
+            limits.rule_budget_ms = 0.0
+        return limits
+
+
+class ScreeningTimeout(Exception):
+    """Raised when regex rules exceed their time budget. Callers must fail closed."""
+    def __init__(self, rules, elapsed_ms):
+        self.rules = rules
+        self.elapsed_ms = elapsed_ms
+        super().__init__(f"Screening budget exceeded after {elapsed_ms:.1f}ms ({', '.join(rules)})")
+
+
+@dataclass
+class RuleHit:
+    rule: Rule
+    start: int = -1
+
+
+class LiteralAutomaton:
+    """Aho-Corasick automaton: reports every (possibly overlapping) literal in one pass."""
+    def __init__(self, literals: Dict[int, str]):
+        self.size = len(literals)
+        if ahocorasick is not None:
+            self._native = ahocorasick.Automaton()
+            for rule_id, word in literals.items():
+                self._native.add_word(word, (rule_id, len(word)))
+            if literals: self._native.make_automaton()
+            return
+
+        self._native = None
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for rule_id, word in literals.items():
+            node = 0
+            for ch in word:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({}); self._fail.append(0); self._out.append([])
+                node = nxt
+            self._out[node].append((rule_id, len(word)))
+
+        # Breadth-first failure links; outputs inherit along the failure chain
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                link = self._goto[f].get(ch, 0)
+                self._fail[nxt] = 0 if link == nxt else link  # depth-1 nodes fail to the root
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str, found: Dict[int, int]):
+        """Adds {rule_id: start} for the first occurrence of every literal in `text`."""
+        if not self.size: return
+        if self._native is not None:
+            for end, (rule_id, length) in self._native.iter(text):
+                found.setdefault(rule_id, end - length + 1)
+            return
+
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                for rule_id, length in out[node]:
+                    if rule_id not in found:
+                        found[rule_id] = i - length + 1
+
+
+class RegexSet:
+    """
+    Regex rules combined into one alternation of named groups.
+    A pass reports the leftmost match of any remaining rule; rules already hit
+    are dropped and the scan repeats only while it keeps finding new rules, so
+    clean text costs one pass regardless of rule count.
+
+    Each rule gets `budget_ms` of matching time per scan (the combined pass gets
+    the sum for its members), enforced inside the match by the `regex` package;
+    without it there is no budget. Anchored rules skip windowing and scan the
+    whole text, so ^ and $ keep meaning the start and end of the input.
+    """
+    def __init__(self, patterns: Dict[int, str], names=None, budget_ms=0.0):
+        self.patterns = patterns
+        self.names = names or {r: str(r) for r in patterns}
+        self.budget_ms = budget_ms if timed_re is not None else 0.0
+        self._re = timed_re if self.budget_ms else re
+        self._separate = {}
+        self._combined = {}
+        self._whole = set()  # Anchored rules, scanned against the full text
+
+        # Backreferences, named groups and inline flags don't survive being combined
+        combinable = []
+        for rule_id, pattern in list(patterns.items()):
+            if is_anchored(pattern): self._whole.add(rule_id)
+            try:
+                if re.search(r"\\\d|\(\?P[<=]|\(\?[aiLmsux]", pattern):
+                    self._separate[rule_id] = self._re.compile(pattern)
+                else:
+                    self._re.compile(f"(?P<r{rule_id}>{pattern})")
+                    combinable.append(rule_id)
+            except (re.error, self._re.error) as e:
+                print(f"⚠️ Skipping invalid screening pattern {pattern!r}: {e}")
+                del self.patterns[rule_id]
+        self._combinable = tuple(combinable)
+        self._compile(self._combinable)
+
+    def _compile(self, rule_ids):
+        key = tuple(rule_ids)
+        if key not in self._combined:
+            if len(self._combined) > 64: self._combined.clear()
+            self._combined[key] = self._re.compile("|".join(f"(?P<r{r}>{self.patterns[r]})" for r in key)) if key else None
+        return self._combined[key]
+
+    def _matches(self, rx, text, allowance):
+        """Returns (matches, seconds spent); `allowance` is None when unbudgeted."""
+        start = time.perf_counter()
+        if allowance is None:
+            matches = list(rx.finditer(text))
+        else:
+            try:
+                matches = list(rx.finditer(text, timeout=max(allowance, 1e-4)))
+            except TimeoutError:
+                matches = None
+        return matches, time.perf_counter() - start
+
+    def find(self, text: str, found: Dict[int, int], skip=(), window=0, overlap=0):
+        """
+        Adds {rule_id: start} for each matching rule, scanning `window`-sized
+        slices of `text` (anchored rules scan all of it).
+        """
+        window = window if 0 < window < len(text) else len(text)
+        step = max(1, window - overlap)
+        combinable = [r for r in self._combinable if r not in found and r not in skip]
+        separate = [r for r in self._separate if r not in found and r not in skip]
+
+        # Seconds of matching left per group: the combined pass shares its members' budgets
+        budget = self.budget_ms / 1000 if self.budget_ms else None
+        left = {r: budget for r in separate}
+        left["combined"] = budget * len(combinable) if budget else None
+
+        def spend(group, spent, matches, rule_ids):
+            if left[group] is None: return
+            left[group] -= spent
+            if matches is None or left[group] < 0:
+                names = [self.names[r] for r in rule_ids]
+                raise ScreeningTimeout(names, (budget * max(1, len(rule_ids)) - left[group]) * 1000)
+
+        def scan(chunk, offset, combinable, separate):
+            remaining = tuple(r for r in combinable if r not in found)
+            while remaining:
+                matches, spent = self._matches(self._compile(remaining), chunk, left["combined"])
+                spend("combined", spent, matches, remaining)
+                new = {}
+                for m in matches:
+                    new.setdefault(int(m.lastgroup[1:]), offset + m.start())
+                if not new: break
+                found.update(new)
+                remaining = tuple(r for r in remaining if r not in new)
+
+            for rule_id in separate:
+                if rule_id in found: continue
+                matches, spent = self._matches(self._separate[rule_id], chunk, left[rule_id])
+                spend(rule_id, spent, matches, [rule_id])
+                if matches: found[rule_id] = offset + matches[0].start()
+
+        whole = self._whole if window < len(text) else ()
+        windowed = ([r for r in combinable if r not in whole], [r for r in separate if r not in whole])
+        for offset in range(0, max(len(text) - overlap, 1), step):
+            scan(text[offset:offset + window], offset, *windowed)
+        if whole:
+            scan(text, 0, [r for r in combinable if r in whole], [r for r in separate if r in whole])
+
+
+class RuleEngine:
+    """
+    Compiles screening rules once into a literal automaton plus a combined regex
+    set per text view, then evaluates all of them in a single pass per view.
+    With `limits`, regex rules scan in bounded windows under a time budget and
+    scan() raises ScreeningTimeout when a rule exceeds it.
+    """
+    def __init__(self, rules: List[Rule], limits: ScreeningLimits = None):
+        self.rules = list(rules)
+        self.limits = limits
+        budget_ms = limits.rule_budget_ms if limits else 0.0
+        self._views = {}
+        for target in dict.fromkeys(r.target for r in self.rules):
+            ids = [i for i, r in enumerate(self.rules) if r.target == target]
+            self._views[target] = (
+                LiteralAutomaton({i: self.rules[i].pattern for i in ids if self.rules[i].is_literal}),
+                RegexSet({i: self.rules[i].pattern for i in ids if not self.rules[i].is_literal},
+                         names={i: self.rules[i].name for i in ids}, budget_ms=budget_ms),
+                [(i, self.rules[i].min_length) for i in ids if self.rules[i].min_length]
+            )
+
+    @property
+    def targets(self):
+        return tuple(self._views)
+
+    def scan(self, views: Dict[str, str]) -> List[RuleHit]:
+        """
+        Evaluates every rule against its named view, e.g. {"lower": low, "raw": text}.
+        Returns hits in rule definition order.
+        """
+        window, overlap = (self.limits.chunk_size, self.limits.chunk_overlap) if self.limits else (0, 0)
+        found = {}
+        for target, (literals, regexes, gated) in self._views.items():
+            text = views.get(target)
+            if text is None: continue
+            too_short = {i for i, min_len in gated if len(text) < min_len}
+            literals.find(text, found)
+            regexes.find(text, found, skip=too_short, window=window, overlap=overlap)
+            for i in too_short: found.pop(i, None)
+        return [RuleHit(self.rules[i], found[i]) for i in sorted(found)]
+
+    def matches_any(self, views: Dict[str, str]) -> bool:
+        return bool(self.scan(views))
@@ -0,0 +1,220 @@
+import os
+import json
+import sqlite3
+import threading
+
+try:
+    from core.state_journal import StateJournal
+except ImportError:
+    from state_journal import StateJournal
+
+SCHEMA_VERSION = 1
+
+# List fields stored one row per item; row ids keep the list order
+LIST_TABLES = {"appointments": "appointments", "task_memory": "tasks", "chat_history": "chat"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS appointments (
+    id INTEGER PRIMARY KEY, date TEXT, time TEXT, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS appointments_when ON appointments(date, time);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY, status TEXT, priority TEXT, completed INTEGER NOT NULL DEFAULT 0, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS tasks_open ON tasks(completed, status, priority);
+CREATE TABLE IF NOT EXISTS chat (
+    id INTEGER PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+def _columns(table, item):
+    """Indexed columns pulled out of a record (the full record stays in `data`)."""
+    if table == "appointments":
+        return {"date": item.get("date"), "time": item.get("time")}
+    if table == "tasks":
+        return {"status": item.get("status"), "priority": item.get("priority"), "completed": 1 if item.get("completed") else 0}
+    return {}
+
+
+class SqliteStateStore:
+    """
+    SQLite persistence for JarvisState (storage.engine: sqlite).
+    Drop-in for StateJournal: `append()` applies each journal op as a small
+    transaction and `compact()` rewrites every table. The database runs in WAL
+    mode, so other processes (dashboards, scripts) can read while Jarvis writes,
+    and appointments (date, time) and tasks (completed, status, priority) are
+    indexed for the range and open-task queries below.
+    On first use, an existing jarvis_state.json (and its journal) is migrated.
+    """
+    def __init__(self, db_path, snapshot_path=None):
+        self.path = db_path
+        self.snapshot_path = snapshot_path
+        self.seq = 0
+        self.records = 0   # Always 0: nothing to compact, every op is applied in place
+        self.writes = 0
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._row_ids = {key: [] for key in LIST_TABLES}  # Position -> row id, per list field
+        self._db = self._connect()
+        self._db.executescript(SCHEMA)
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _reader(self):
+        """Per-thread read connection; WAL readers never block the writer."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            db.execute("PRAGMA query_only=ON")
+        return db
+
+    def _get_meta(self, key, default=None):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, key, value):
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    # --- LOAD / MIGRATION ---
+
+    def load(self):
+        """Returns the stored state as a plain dict, migrating from the JSON files on first use."""
+        with self._lock:
+            if self._get_meta("schema_version") is None:
+                legacy = StateJournal(self.snapshot_path).load() if self.snapshot_path else None
+                if legacy is None:
+                    return None
+                self.compact(legacy)
+                print(f"✅ Migrated {os.path.basename(self.snapshot_path)} to SQLite ({os.path.basename(self.path)})")
+
+            data = {}
+            for key, table in LIST_TABLES.items():
+                rows = self._db.execute(f"SELECT id, data FROM {table} ORDER BY id").fetchall()
+                self._row_ids[key] = [r[0] for r in rows]
+                data[key] = [json.loads(r[1]) for r in rows]
+            for (key, value) in self._db.execute("SELECT key, value FROM meta").fetchall():
+                if key not in ("schema_version", "seq"): data[key] = json.loads(value)
+            self.seq = self._get_meta("seq", 0)
+            return data
+
+    # --- WRITES ---
+
+    def _insert(self, key, items):
+        table = LIST_TABLES[key]
+        written = 0
+        for item in items:
+            cols = _columns(table, item)
+            names = ", ".join(list(cols) + ["data"])
+            marks = ", ".join("?" * (len(cols) + 1))
+            payload = json.dumps(item)
+            cur = self._db.execute(f"INSERT INTO {table} ({names}) VALUES ({marks})", (*cols.values(), payload))
+            self._row_ids[key].append(cur.lastrowid)
+            written += len(payload)
+        return written
+
+    def _delete(self, key, positions):
+        ids = self._row_ids[key]
+        doomed = [ids[i] for i in positions]
+        self._db.executemany(f"DELETE FROM {LIST_TABLES[key]} WHERE id = ?", [(i,) for i in doomed])
+        drop = set(positions)
+        self._row_ids[key] = [rid for i, rid in enumerate(ids) if i not in drop]
+
+    def _apply(self, op):
+        kind, key = op["op"], op["key"]
+        if key not in LIST_TABLES:
+            if kind == "set": self._set_meta(key, op["value"])
+            elif kind == "merge": self._set_meta(key, {**(self._get_meta(key, {}) or {}), **op["fields"]})
+            else: raise ValueError(f"Op {kind} needs a list field, got {key}")
+            return
+
+        table = LIST_TABLES[key]
+        if kind == "append": self._insert(key, [op["value"]])
+        elif kind == "extend": self._insert(key, op["values"])
+        elif kind == "update":
+            rid = self._row_ids[key][op["index"]]
+            item = json.loads(self._db.execute(f"SELECT data FROM {table} WHERE id = ?", (rid,)).fetchone()[0])
+            item.update(op["fields"])
+            for field in op.get("unset", ()): item.pop(field, None)
+            cols = _columns(table, item)
+            assigns = ", ".join([f"{c} = ?" for c in cols] + ["data = ?"])
+            self._db.execute(f"UPDATE {table} SET {assigns} WHERE id = ?", (*cols.values(), json.dumps(item), rid))
+        elif kind == "remove": self._delete(key, op["indices"])
+        elif kind == "trim": self._delete(key, range(min(op["count"], len(self._row_ids[key]))))
+        elif kind == "set":
+            self._db.execute(f"DELETE FROM {table}")
+            self._row_ids[key] = []
+            self._insert(key, op["value"])
+        elif kind == "insert":
+            # Row ids carry the list order, so the tail from the first insert position is rewritten
+            ids = self._row_ids[key]
+            first = min(i for i, _ in op["items"])
+            tail = []
+            if first < len(ids):
+                rows = self._db.execute(f"SELECT data FROM {table} WHERE id >= ? ORDER BY id", (ids[first],)).fetchall()
+                tail = [json.loads(r[0]) for r in rows]
+                self._db.execute(f"DELETE FROM {table} WHERE id >= ?", (ids[first],))
+                self._row_ids[key] = ids[:first]
+            for i, item in sorted(op["items"], key=lambda pair: pair[0]): tail.insert(i - first, item)
+            self._insert(key, tail)
+        else: raise ValueError(f"Unknown journal op: {kind}")
+
+    def append(self, ops):
+        """Applies one mutation's ops in a single transaction. Returns its sequence number."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for op in ops: self._apply(op)
+                self.seq += 1
+                self._set_meta("seq", self.seq)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                self.load()  # Resync row-id maps with what is actually stored
+                raise
+            self.writes += 1
+            return self.seq
+
+    def compact(self, data):
+        """Replaces the stored state with `data` (used for direct edits and migration). Returns bytes written."""
+        with self._lock:
+            written = 0
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for key, table in LIST_TABLES.items():
+                    self._db.execute(f"DELETE FROM {table}")
+                    self._row_ids[key] = []
+                    written += self._insert(key, data.get(key, []))
+                for key, value in data.items():
+                    if key not in LIST_TABLES and key != "journal_seq": self._set_meta(key, value)
+                self._set_meta("schema_version", SCHEMA_VERSION)
+                self._set_meta("seq", self.seq)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self.writes += 1
+            return written
+
+    # --- INDEXED QUERIES ---
+
+    def appointments_between(self, start_date, end_date):
+        """Appointments with start_date <= date <= end_date (ISO strings), ordered by date and time."""
+        rows = self._reader().execute(
+            "SELECT data FROM appointments WHERE date BETWEEN ? AND ? ORDER BY date, time, id",
+            (start_date, end_date)).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def open_tasks(self):
+        rows = self._reader().execute("SELECT data FROM tasks WHERE completed = 0 ORDER BY id").fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def stats(self):
+        return {"engine": "sqlite", "seq": self.seq, "writes": self.writes, "path": self.path}
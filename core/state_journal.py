@@ -0,0 +1,174 @@
+import os
+import json
+import threading
+
+# Operations a journal record can carry. Each applies to one top-level state key:
+#   set     - replace the value                          {"key", "value"}
+#   merge   - dict.update on a dict value                {"key", "fields"}
+#   append  - append one item to a list                  {"key", "value"}
+#   extend  - append several items to a list             {"key", "values"}
+#   update  - dict.update on one list item               {"key", "index", "fields"[, "unset"]}
+#   remove  - delete list items by position              {"key", "indices"}
+#   trim    - drop the oldest `count` list items         {"key", "count"}
+#   insert  - put items back at their final positions    {"key", "items": [[index, item], ...]}
+# Items and dict values are replaced rather than edited in place, so a record or dict
+# that a reader already holds (e.g. in a JarvisState snapshot) never changes under it.
+OPS = ("set", "merge", "append", "extend", "update", "remove", "trim", "insert")
+
+
+def apply_op(data, op):
+    """Applies one journal operation to a plain state dict (as produced by JarvisState.to_dict)."""
+    kind, key = op["op"], op["key"]
+    if kind == "set": data[key] = op["value"]
+    elif kind == "merge": data[key] = {**(data.get(key) or {}), **op["fields"]}
+    elif kind == "append": data.setdefault(key, []).append(op["value"])
+    elif kind == "extend": data.setdefault(key, []).extend(op["values"])
+    elif kind == "update":
+        items = data[key]
+        item = {**items[op["index"]], **op["fields"]}
+        for field in op.get("unset", ()): item.pop(field, None)
+        items[op["index"]] = item
+    elif kind == "remove":
+        items, drop = data[key], set(op["indices"])
+        if len(drop) == 1: del items[next(iter(drop))]
+        elif drop: items[:] = [item for i, item in enumerate(items) if i not in drop]
+    elif kind == "trim": del data[key][:op["count"]]
+    elif kind == "insert":
+        for i, item in sorted(op["items"], key=lambda pair: pair[0]): data[key].insert(i, item)
+    else: raise ValueError(f"Unknown journal op: {kind}")
+
+
+def invert_op(data, op):
+    """
+    The ops that undo `op`, computed from `data` *before* `op` is applied.
+    Inverses reference the affected items only, so their size tracks the change.
+    """
+    kind, key = op["op"], op["key"]
+    if kind == "set": return [{"op": "set", "key": key, "value": data.get(key)}]
+    if kind == "merge": return [{"op": "set", "key": key, "value": dict(data.get(key) or {})}]
+    if kind == "append": return [{"op": "remove", "key": key, "indices": [len(data.get(key, []))]}]
+    if kind == "extend":
+        start = len(data.get(key, []))
+        return [{"op": "remove", "key": key, "indices": list(range(start, start + len(op["values"])))}]
+    if kind == "update":
+        item = data[key][op["index"]]
+        return [{"op": "update", "key": key, "index": op["index"],
+                 "fields": {f: item[f] for f in op["fields"] if f in item},
+                 "unset": [f for f in op["fields"] if f not in item]}]
+    if kind == "remove":
+        return [{"op": "insert", "key": key, "items": [[i, data[key][i]] for i in sorted(set(op["indices"]))]}]
+    if kind == "trim":
+        return [{"op": "insert", "key": key, "items": [[i, data[key][i]] for i in range(min(op["count"], len(data[key])))]}]
+    if kind == "insert":
+        return [{"op": "remove", "key": key, "indices": [i for i, _ in op["items"]]}]
+    raise ValueError(f"Unknown journal op: {kind}")
+
+
+def write_json_atomic(path, data):
+    """Writes `data` to a temp file, fsyncs it and renames it over `path`. Returns bytes written."""
+    payload = json.dumps(data, indent=2)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    try:
+        # Make the rename itself durable (not supported on Windows)
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try: os.fsync(fd)
+        finally: os.close(fd)
+    except OSError:
+        pass
+    return len(payload)
+
+
+class StateJournal:
+    """
+    Write-ahead journal beside the JSON state snapshot.
+    Each mutation is appended to `<snapshot>.journal` as one JSON line
+    ({"seq": n, "ops": [...]}), so a write costs O(change) instead of
+    rewriting the whole file. `compact()` folds the journal into a fresh
+    snapshot (written to a temp file, then renamed over the old one) that
+    records the last sequence number it includes; `load()` replays only the
+    records after it. A torn final line from a crash mid-append is dropped.
+    """
+    def __init__(self, snapshot_path, fsync=False):
+        self.snapshot_path = snapshot_path
+        self.path = snapshot_path + ".journal"
+        self.fsync = fsync
+        self.seq = 0            # Last sequence number written
+        self.records = 0        # Records appended since the last compaction
+        self.appended_bytes = 0
+        self.compactions = 0
+        self._fh = None
+        self._lock = threading.RLock()
+
+    def load(self):
+        """Returns the snapshot with the journal replayed on top, or None if nothing is stored."""
+        with self._lock:
+            data, base_seq = None, 0
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, "r") as f:
+                    data = json.load(f)
+                base_seq = data.pop("journal_seq", 0)
+            self.seq, self.records = base_seq, 0
+
+            if os.path.exists(self.path):
+                valid_bytes = 0
+                with open(self.path, "rb") as f:
+                    for raw in f:
+                        try:
+                            record = json.loads(raw)
+                        except ValueError:
+                            print(f"⚠️ Journal: dropping torn record after seq {self.seq}")
+                            break
+                        valid_bytes += len(raw)
+                        if record["seq"] <= base_seq: continue  # Already folded into the snapshot
+                        if data is None: data = {}
+                        for op in record["ops"]: apply_op(data, op)
+                        self.seq, self.records = record["seq"], self.records + 1
+                if valid_bytes < os.path.getsize(self.path):
+                    with open(self.path, "r+b") as f: f.truncate(valid_bytes)
+            return data
+
+    def append(self, ops):
+        """Durably appends one record (a list of ops applied together). Returns its sequence number."""
+        with self._lock:
+            if self._fh is None:
+                self._fh = open(self.path, "a", encoding="utf-8")
+            self.seq += 1
+            line = json.dumps({"seq": self.seq, "ops": ops}, separators=(",", ":")) + "\n"
+            self._fh.write(line)
+            self._fh.flush()
+            if self.fsync: os.fsync(self._fh.fileno())
+            self.records += 1
+            self.appended_bytes += len(line)
+            return self.seq
+
+    def compact(self, data):
+        """Writes `data` (the full current state) as the new snapshot and empties the journal. Returns bytes written."""
+        with self._lock:
+            written = write_json_atomic(self.snapshot_path, dict(data, journal_seq=self.seq))
+            # The snapshot now covers every record, so the journal can start over
+            if self._fh is not None:
+                self._fh.close()
+            self._fh = open(self.path, "w", encoding="utf-8")
+            self.records = 0
+            self.compactions += 1
+            return written
+
+    def close(self):
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    def stats(self):
+        return {
+            "engine": "journal",
+            "seq": self.seq,
+            "pending_records": self.records,
+            "appended_bytes": self.appended_bytes,
+            "compactions": self.compactions
+        }
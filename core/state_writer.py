@@ -0,0 +1,126 @@
+import time
+import atexit
+import threading
+
+
+class StateWriter:
+    """
+    One long-lived thread that performs JarvisState's full writes.
+    `mark_dirty()` only flags the state; the worker waits until no new change
+    has arrived for `delay` seconds, or until the oldest unwritten change is
+    `max_latency` seconds old, then calls `write_fn()` once for the whole burst.
+    `write_now()` writes in the caller's thread (write_fn must serialize itself,
+    JarvisState does so under its lock) and clears the pending flag. A failed
+    write leaves the change pending and is retried after a backoff (doubling
+    from `delay`, capped at `max_latency`). `close()` flushes anything pending
+    and stops the thread; it is also run at exit.
+    """
+    def __init__(self, write_fn, delay=2.0, max_latency=10.0, name="state-writer"):
+        self.write_fn = write_fn
+        self.delay = max(0.0, float(delay))
+        self.max_latency = max(self.delay, float(max_latency))
+        self.name = name
+        self._cond = threading.Condition()
+        self._dirty_since = None   # First unwritten change
+        self._last_change = None   # Latest unwritten change
+        self._retry_at = None      # After a failed write, no retry before this
+        self._failures = 0         # Consecutive failed writes
+        self._closed = False
+
+        self.notifications = 0
+        self.writes = 0
+        self.bytes_written = 0
+        self.errors = 0
+        self.last_write_ms = 0.0
+        self.max_lag_ms = 0.0      # Longest time a change waited to be written
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def mark_dirty(self):
+        if self._closed:
+            self.write_now()  # Late change after shutdown: no worker left to pick it up
+            return
+        with self._cond:
+            now = time.monotonic()
+            if self._dirty_since is None: self._dirty_since = now
+            self._last_change = now
+            self.notifications += 1
+            self._cond.notify()
+
+    def _take_pending(self):
+        """Clears the dirty flag; changes after this point schedule another write."""
+        since, self._dirty_since, self._last_change = self._dirty_since, None, None
+        return since
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._dirty_since is None and not self._closed:
+                    self._cond.wait()
+                if self._dirty_since is None: return  # Closed with nothing pending
+                while not self._closed:
+                    now = time.monotonic()
+                    due = min(self._last_change + self.delay, self._dirty_since + self.max_latency)
+                    if self._retry_at is not None: due = max(due, self._retry_at)
+                    if now >= due: break
+                    self._cond.wait(due - now)
+                if self._dirty_since is None: continue  # Written inline by write_now() meanwhile
+                since = self._take_pending()
+            if not self._write(since) and self._closed: return  # Final flush failed; nothing left to retry it
+
+    def _write(self, since):
+        """Calls write_fn(); on failure the change is pending again. Returns True if it was written."""
+        start = time.monotonic()
+        try:
+            written = self.write_fn()
+        except Exception as e:
+            with self._cond:
+                self.errors += 1
+                self._failures += 1
+                now = time.monotonic()
+                self._retry_at = now + min(self.max_latency, max(self.delay, 0.5) * 2 ** (self._failures - 1))
+                if since is not None and (self._dirty_since is None or since < self._dirty_since):
+                    self._dirty_since = since
+                if self._dirty_since is None: self._dirty_since = now
+                if self._last_change is None: self._last_change = now
+                self._cond.notify()
+            print(f"⚠️ {self.name}: write failed ({e}), retrying")
+            return False
+        end = time.monotonic()
+        with self._cond:
+            self._failures, self._retry_at = 0, None
+            self.writes += 1
+            self.bytes_written += written or 0
+            self.last_write_ms = round((end - start) * 1000, 2)
+            if since is not None: self.max_lag_ms = max(self.max_lag_ms, round((end - since) * 1000, 2))
+        return True
+
+    def write_now(self):
+        """Writes immediately in the calling thread, absorbing any pending write."""
+        with self._cond:
+            since = self._take_pending()
+        self._write(since)
+
+    def close(self):
+        """Flushes a pending write and stops the worker. Safe to call more than once."""
+        with self._cond:
+            if self._closed: return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        atexit.unregister(self.close)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": self._dirty_since is not None,
+                "notifications": self.notifications,
+                "writes": self.writes,
+                "coalesced": max(0, self.notifications - self.writes),
+                "bytes_written": self.bytes_written,
+                "errors": self.errors,
+                "last_write_ms": self.last_write_ms,
+                "max_lag_ms": self.max_lag_ms
+            }
@@ -110,9 +110,8 @@ class TherapyEngine:
         negativity = new_emotions.get("sadness", 0) + new_emotions.get("anxiety", 0) + new_emotions.get("anger", 0)
         trend = positivity - negativity
 
-        self.state.therapy_data.update({
+        self.state.merge_field("therapy_data", {
             "emotions": new_emotions,
             "distortions": new_distortions,
             "mood_trend": round(trend, 2)
-        })
-        self.state.save()
\ No newline at end of file
+        })
\ No newline at end of file
@@ -0,0 +1,137 @@
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+_current_trace = contextvars.ContextVar("jarvis_trace", default=None)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of `samples` (pct in 0-1); 0.0 when empty."""
+    if not samples: return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+@dataclass
+class Trace:
+    """Timed spans for one request. Span starts are ms offsets from the request start."""
+    request_id: str
+    text: str
+    started: float = field(default_factory=time.perf_counter)
+    wall_time: float = field(default_factory=time.time)
+    spans: List[Dict[str, Any]] = field(default_factory=list)
+    total_ms: Optional[float] = None
+    verdict: Optional[str] = None
+
+    def add(self, name, start, end):
+        # list.append is atomic, so spans from executor threads need no lock
+        self.spans.append({
+            "name": name,
+            "start_ms": round((start - self.started) * 1000, 3),
+            "ms": round((end - start) * 1000, 3),
+            "thread": threading.current_thread().name
+        })
+
+    def durations(self) -> Dict[str, float]:
+        """Total ms per span name (a stage hit twice in one request is summed)."""
+        totals = {}
+        for s in self.spans:
+            totals[s["name"]] = round(totals.get(s["name"], 0.0) + s["ms"], 3)
+        return totals
+
+    def to_dict(self):
+        return {
+            "request_id": self.request_id,
+            "text": self.text[:60],
+            "time": self.wall_time,
+            "verdict": self.verdict,
+            "total_ms": self.total_ms,
+            "spans": sorted(self.spans, key=lambda s: s["start_ms"])
+        }
+
+
+@contextmanager
+def span(name):
+    """Times the enclosed block into the current request's trace (no-op outside a traced request)."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, start, time.perf_counter())
+
+
+def traced(name, fn):
+    """Wraps `fn` so each call is recorded as span `name`."""
+    def run(*args, **kwargs):
+        with span(name):
+            return fn(*args, **kwargs)
+    return run
+
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit that carries the caller's context (trace, request) into the worker thread."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class Tracer:
+    """
+    Per-request span collector. Finished traces go into a ring buffer of
+    `capacity` entries; `summary()` gives per-stage p50/p95 over the buffer so
+    the stage that owns the tail latency is visible at a glance.
+    """
+    def __init__(self, capacity=256, enabled=True):
+        self.enabled = enabled
+        self.capacity = max(1, int(capacity))
+        self._buffer = deque(maxlen=self.capacity)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def trace(self, request_id, text):
+        if not self.enabled:
+            yield None
+            return
+        trace = Trace(request_id, text)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            trace.total_ms = round((time.perf_counter() - trace.started) * 1000, 3)
+            with self._lock:
+                self._buffer.append(trace)
+
+    def recent(self, limit=None) -> List[Trace]:
+        with self._lock:
+            traces = list(self._buffer)
+        return traces[-limit:] if limit else traces
+
+    def summary(self):
+        traces = self.recent()
+        per_stage = {}
+        for t in traces:
+            for name, ms in t.durations().items():
+                per_stage.setdefault(name, []).append(ms)
+        totals = [t.total_ms for t in traces if t.total_ms is not None]
+        stages = {
+            name: {
+                "count": len(samples),
+                "p50_ms": round(percentile(samples, 0.50), 3),
+                "p95_ms": round(percentile(samples, 0.95), 3),
+                "max_ms": round(max(samples), 3)
+            }
+            for name, samples in sorted(per_stage.items())
+        }
+        return {
+            "requests": len(traces),
+            "capacity": self.capacity,
+            "total": {"p50_ms": round(percentile(totals, 0.50), 3), "p95_ms": round(percentile(totals, 0.95), 3)},
+            "stages": stages
+        }
@@ -1,18 +1,44 @@
 import json
 import os
-import urllib.request
 import yaml
 import re
 import uuid
-import io
-import sys
 import threading
-import copy
 import traceback
+import time
+import contextvars
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor, Future
 from dataclasses import dataclass, field
-from typing import List, Dict, Any, Optional
+from types import MappingProxyType
+from typing import List, Dict, Any, Mapping, Optional
 from datetime import datetime, timedelta
 
+try:
+    from core.rule_engine import Rule, RuleEngine, ScreeningLimits, ScreeningTimeout
+    from core.intent_index import IntentIndex
+    from core.job_queue import StageLimiter
+    from core.tracing import Tracer, span, traced, submit
+    from core.state_journal import StateJournal, apply_op, invert_op, write_json_atomic
+    from core.sqlite_store import SqliteStateStore
+    from core.state_writer import StateWriter
+    from core.appointment_index import AppointmentIndex, iso_date
+    from core.record_index import RecordIndex, new_record_id
+    from core.change_log import ChangeLog
+    from core.http_client import HTTPClient, HTTPStatusError
+except ImportError:
+    from rule_engine import Rule, RuleEngine, ScreeningLimits, ScreeningTimeout
+    from intent_index import IntentIndex
+    from job_queue import StageLimiter
+    from tracing import Tracer, span, traced, submit
+    from state_journal import StateJournal, apply_op, invert_op, write_json_atomic
+    from sqlite_store import SqliteStateStore
+    from state_writer import StateWriter
+    from appointment_index import AppointmentIndex, iso_date
+    from record_index import RecordIndex, new_record_id
+    from change_log import ChangeLog
+    from http_client import HTTPClient, HTTPStatusError
+
 # ============================================================
 # --- CONFIGURATION ---
 # ============================================================
@@ -57,13 +83,25 @@ class Config:
 # --- NOTIFICATION SERVICE ---
 # ============================================================
 
+_http_client = None
+_http_client_lock = threading.Lock()
+
+def http_client() -> HTTPClient:
+    """The process-wide pooled HTTP client for outbound calls (Ollama, ntfy, wttr.in), built from `http` config."""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            cfg = Config.get("http", {}) or {}
+            _http_client = HTTPClient(max_idle=cfg.get("pool_size", 4), idle_timeout=cfg.get("idle_timeout", 30),
+                                      retries=cfg.get("retries", 2), backoff=cfg.get("backoff", 0.25),
+                                      backoff_max=cfg.get("backoff_max", 4.0), timeout=cfg.get("timeout", 10),
+                                      timeouts=cfg.get("timeouts", {}))
+        return _http_client
+
 class NotificationService:
     """Sends push notifications via ntfy.sh."""
     @staticmethod
     def send(message: str, title: str = "Jarvis"):
-        from urllib.error import HTTPError, URLError
-        import socket
-        
         topic = str(Config.get("ntfy_topic", "jarvis_default")).strip()
         
         if topic == "jarvis_default":
@@ -71,16 +109,18 @@ class NotificationService:
 
         try:
             url = f"https://ntfy.sh/{topic}"
-            data = message.encode('utf-8')
-            req = urllib.request.Request(url, data=data, method='POST')
-            req.add_header("Title", title)
             is_urgent = "urgent" in message.lower()
-            req.add_header("Priority", "high" if is_urgent else "default")
-            req.add_header("Tags", "robot,warning" if is_urgent else "robot")
+            headers = {
+                "Title": title,
+                "Priority": "high" if is_urgent else "default",
+                "Tags": "robot,warning" if is_urgent else "robot"
+            }
             
             print(f"📤 Sending notification to topic: {topic}")
             
-            with urllib.request.urlopen(req, timeout=5) as response:
+            client = http_client()
+            with client.post(url, message.encode('utf-8'), headers=headers, timeout=client.timeout("ntfy", 5)) as response:
+                response.read()
                 status = response.getcode()
                 if status == 200:
                     print(f"✅ Notification sent successfully (status {status})")
@@ -89,14 +129,14 @@ class NotificationService:
                     print(f"❌ Notification failed with status code: {status}")
                     return False
 
-        except HTTPError as error:
+        except HTTPStatusError as error:
             print(f"❌ HTTP Error {error.code}: {error.reason}")
             return False
-        except URLError as error:
-            if isinstance(error.reason, socket.timeout):
-                print(f"❌ Connection timeout to ntfy.sh")
-            else:
-                print(f"❌ URL Error: {error.reason}")
+        except TimeoutError:
+            print(f"❌ Connection timeout to ntfy.sh")
+            return False
+        except OSError as error:
+            print(f"❌ URL Error: {error}")
             return False
         except Exception as e:
             print(f"❌ Unexpected error in NotificationService: {e}")
@@ -152,31 +192,39 @@ class InternalForensicReasoner:
         
         # Load external patterns from Config if available
         self.custom_patterns = Config.get("detection_patterns", {})
+        self.limits = ScreeningLimits.from_dict((Config.get("security", {}) or {}).get("screening"))
+        self.compile_rules()
 
-    def analyze(self, text: str, accumulator=None) -> ForensicReport:
-        low = text.lower()
-        score = 0.0
-        reasons = []
-
-        # 1. Check Hardcoded Threat Keywords
+    def compile_rules(self):
+        """Compiles threat keywords and configured patterns into one RuleEngine."""
+        rules = []
         for category, patterns in self.threat_keywords.items():
             for pattern in patterns:
-                if re.search(pattern, low):
-                    weight = 0.4 if category == "jailbreak" else 0.7
-                    score += weight
-                    reasons.append(f"Detected {category} pattern: '{pattern}'")
-
-        # 2. Check Configured Detection Patterns (Hex, Base64, etc.)
-        for name, data in self.custom_patterns.items():
-            pattern = data.get("pattern")
-            weight = data.get("weight", 0.5)
-            min_len = data.get("min_length", 0)
-            
-            if len(text) < min_len: continue
-            
-            if pattern and re.search(pattern, text): # Check against raw text for case-sensitive encodings
-                score += weight
-                reasons.append(f"{data.get('description', 'Suspicious Pattern')}: '{name}'")
+                rules.append(Rule(
+                    name=pattern, pattern=pattern, category=category, target="lower",
+                    weight=0.4 if category == "jailbreak" else 0.7,
+                    reason=f"Detected {category} pattern: '{pattern}'"
+                ))
+        for name, data in (self.custom_patterns or {}).items():
+            if not data.get("pattern"): continue
+            # Checked against raw text for case-sensitive encodings
+            rules.append(Rule(
+                name=name, pattern=data["pattern"], category="custom", target="raw",
+                weight=data.get("weight", 0.5), min_length=data.get("min_length", 0),
+                reason=f"{data.get('description', 'Suspicious Pattern')}: '{name}'"
+            ))
+        self.rule_engine = RuleEngine(rules, self.limits)
+
+    def analyze(self, text: str, accumulator=None) -> ForensicReport:
+        # Single pass over the lowered and raw views for every keyword and regex rule
+        try:
+            hits = self.rule_engine.scan({"lower": text.lower(), "raw": text})
+            score = sum(hit.rule.weight for hit in hits)
+            reasons = [hit.rule.reason for hit in hits]
+        except ScreeningTimeout as e:
+            # Fail closed: input that stalls a rule is treated as hostile
+            print(f"⏱️ {e}")
+            score, reasons = 1.0, [f"Screening timeout: {', '.join(e.rules)}"]
 
         verdict = "Routine"
         if score >= 0.7: verdict = "High-Risk"
@@ -192,13 +240,192 @@ class InternalForensicReasoner:
             semantic_score=min(score, 1.0)
         )
 
+    def analyze_batch(self, texts, accumulators=None) -> List[ForensicReport]:
+        """Batch counterpart of analyze(); keyword rules need no cross-item work."""
+        texts = list(texts)
+        accumulators = accumulators or [None] * len(texts)
+        return [self.analyze(t, accumulator=acc) for t, acc in zip(texts, accumulators)]
+
+class SecurityPipeline:
+    """
+    Staged early-exit runner for the hybrid (advanced + safety net) strategy.
+    The safety_net and structural stages stop the pipeline only when the final
+    verdict is High-Risk whatever the semantic score, so the router can block
+    before the embedding call. The accumulator still has to see the turn
+    exactly as the legacy path would, which needs that score: such a report is
+    left unsettled and settle() (the router calls it once the block is shown)
+    scores the text and replays the legacy accumulator updates. Stage order
+    and thresholds come from `security.pipeline` in config.yaml.
+    """
+    STAGES = ("safety_net", "structural", "semantic")
+
+    def __init__(self, forensics, safety_net):
+        self.forensics = forensics
+        self.safety_net = safety_net
+        cfg = (Config.get("security", {}) or {}).get("pipeline", {}) or {}
+
+        # Needs the split FPMv5 API; external engines without it run the legacy path
+        self.enabled = cfg.get("enabled", True) and all(
+            hasattr(forensics, m) for m in ("structural_check", "semantic_score", "build_result")
+        )
+        stages = [s for s in cfg.get("stages", self.STAGES) if s in self.STAGES]
+        if "semantic" in stages: stages = stages[:stages.index("semantic")]
+        self.stages = stages + ["semantic"]  # Semantic is always the terminal stage
+
+        # Below 0.7 the safety net is not High-Risk, so it can never be conclusive
+        self.safety_min_score = min(1.0, max(0.7, float(cfg.get("safety_net_min_score", 0.7))))
+        self.last_trace = []
+
+    def prefetch(self, text: str, executor):
+        """
+        Starts every stage's inputs on `executor` at once (concurrent execution mode).
+        None of them touch the accumulator, so evaluate() still applies stages in
+        order; a semantic score the early exits make unnecessary is simply discarded.
+        """
+        return {
+            "safety": submit(executor, traced("security.safety_net", self.safety_net.analyze), text, accumulator=None),
+            "dangerous": submit(executor, traced("security.structural", self.forensics.structural_check), text),
+            "semantic": submit(executor, traced("security.semantic", self.forensics.semantic_score), text)
+        }
+
+    def evaluate(self, text: str, accumulator, benchmark_mode=False, facts=None):
+        """
+        Returns a report with verdict/reasoning/rolling_score plus per-stage costs in
+        variables['stages']. An early exit returns its High-Risk report unsettled
+        (variables['settled'] is False): pass it to settle() before reading rolling_score.
+        """
+        facts = dict(facts or {})
+
+        def fact(name):
+            if name not in facts:
+                if name == "safety":
+                    with span("security.safety_net"): facts[name] = self.safety_net.analyze(text, accumulator=None)
+                elif name == "dangerous":
+                    with span("security.structural"): facts[name] = self.forensics.structural_check(text)
+                elif name == "semantic":
+                    with span("security.semantic"): facts[name] = self.forensics.semantic_score(text)
+            elif isinstance(facts[name], Future):
+                facts[name] = facts[name].result()
+            return facts[name]
+
+        trace = []
+        report = None
+        for stage in self.stages:
+            start = time.perf_counter()
+            if stage == "safety_net":
+                # The override makes any High-Risk safety net final
+                safety = fact("safety")
+                if safety.verdict == "High-Risk" and safety.semantic_score >= self.safety_min_score:
+                    report = self._unsettled(text, fact, accumulator, benchmark_mode)
+            elif stage == "structural":
+                # A danger-word hit is High-Risk, but probation may still downgrade it when
+                # the safety net is clean, and that depends on the semantic score.
+                if fact("dangerous") and (benchmark_mode or fact("safety").verdict != "Routine"):
+                    report = self._unsettled(text, fact, accumulator, benchmark_mode)
+            else:
+                report = self.forensics.build_result(text, fact("dangerous"), fact("semantic"), accumulator)
+                self.apply_safety_net(report, fact("safety"), accumulator, benchmark_mode)
+                report.variables = dict(report.variables, settled=True)
+            trace.append({"stage": stage, "ms": round((time.perf_counter() - start) * 1000, 3), "decided": report is not None})
+            if report is not None: break
+
+        report.variables = dict(report.variables, stages=trace)
+        self.last_trace = trace
+
+        if Config.get("enable_fpm_debug", False) and not benchmark_mode:
+            print("⏱️ FPM stages: " + " → ".join(f"{t['stage']} {t['ms']}ms" for t in trace))
+        return report
+
+    def _unsettled(self, text, fact, accumulator, benchmark_mode):
+        """High-Risk report for an early exit; the accumulator is left for settle()."""
+        safety, dangerous = fact("safety"), fact("dangerous")
+        report = self.forensics.build_result(text, dangerous, 1.0, accumulator=None, log=False)
+        report.verdict = "High-Risk"
+        if safety.verdict == "High-Risk":
+            report.reasoning = f"{safety.reasoning} (Critical Safety Override)"
+        report.rolling_score = accumulator.score
+        # Prefetched semantic score (concurrent mode) or None to compute it on settle()
+        report._settle = (text, dangerous, safety, fact, accumulator, benchmark_mode)
+        report.variables = dict(report.variables, settled=False)
+        return report
+
+    def settle(self, report):
+        """
+        Applies an early-exit turn to the accumulator exactly as the legacy path does
+        (build_result with the real semantic score, then the safety-net override).
+        Updates the report's rolling_score. Returns True if there was anything to settle.
+        """
+        pending = getattr(report, "_settle", None)
+        if pending is None: return False
+        report._settle = None
+        text, dangerous, safety, fact, accumulator, benchmark_mode = pending
+        full = self.forensics.build_result(text, dangerous, fact("semantic"), accumulator)
+        self.apply_safety_net(full, safety, accumulator, benchmark_mode)
+        report.rolling_score = full.rolling_score
+        report.variables = dict(report.variables, semantic=full.variables.get("semantic"), settled=True)
+        return True
+
+    def apply_safety_net(self, report, safety_report, accumulator, benchmark_mode):
+        # C. Override Logic
+        if safety_report.verdict == "High-Risk":
+            if not benchmark_mode:
+                print(f"🛡️ SAFETY NET OVERRIDE: {safety_report.reasoning}")
+            report.verdict = "High-Risk"
+            report.reasoning = f"{safety_report.reasoning} (Critical Safety Override)"
+            if accumulator.score < 1.0:
+                accumulator.update(1.0)
+                report.rolling_score = accumulator.score
+
+        # Probation Logic (Tuned: Only downgrade if confidence is VERY low < 0.4)
+        elif report.verdict == "High-Risk" and safety_report.verdict == "Routine":
+            # DISABLE PROBATION IN BENCHMARK MODE TO REDUCE FALSE NEGATIVES
+            if benchmark_mode:
+                 report.verdict = "High-Risk"
+            else:
+                semantic = getattr(report, "variables", {}).get("semantic", 0.0)
+                if semantic < 0.4:
+                    report.verdict = "Monitor"
+                    print(f"🕊️ PROBATIONARY ALLOW: History is bad ({report.rolling_score:.2f}), but input is benign. Reducing threat.")
+                    accumulator.score = max(0.0, accumulator.score * 0.5)
+
 # ============================================================
 # --- STATE MANAGEMENT ---
 # ============================================================
 
+@dataclass(frozen=True)
+class StateSnapshot:
+    """
+    Immutable view of the persisted fields at one state version: lists are
+    tuples, dicts are read-only proxies. Records are shared with the live state,
+    which never edits them in place (see state_journal.OPS), so a snapshot can
+    be read or serialized from any thread without holding the state lock.
+    """
+    version: int
+    fields: Mapping[str, Any]
+
+    def __getitem__(self, key):
+        return self.fields[key]
+
+    def to_dict(self):
+        """JSON-ready dict (tuples serialize as arrays)."""
+        return {k: dict(v) if isinstance(v, MappingProxyType) else v for k, v in self.fields.items()}
+
+
+def _freeze(value):
+    if isinstance(value, list): return tuple(value)
+    if isinstance(value, dict): return MappingProxyType(dict(value))
+    return value
+
+
 @dataclass
 class JarvisState:
-    """Manages the persistent and transient state of the assistant."""
+    """
+    Manages the persistent and transient state of the assistant.
+    Writers are serialized: every change goes through _apply() under the state
+    lock, from the CLI, Flask threads, router workers and the persistence thread
+    alike. Readers that need a consistent view across fields (the API) take
+    snapshot() instead of reading the live lists.
+    """
     appointments: List[Dict[str, Any]] = field(default_factory=list)
     task_memory: List[Dict[str, Any]] = field(default_factory=list)
     chat_history: List[Dict[str, str]] = field(default_factory=list)
@@ -220,20 +447,65 @@ class JarvisState:
 
     STATE_FILE = os.path.join(os.path.dirname(__file__), "jarvis_state.json")
     _undo_stack: List[Dict] = field(default_factory=list, repr=False)
-    _save_timer: Any = field(default=None, repr=False)
+    _writer: Any = field(default=None, repr=False)  # StateWriter thread, started on first save
+    _appt_index: Any = field(default=None, repr=False)  # AppointmentIndex, see appointment_index()
+    _id_index: Dict[str, Any] = field(default_factory=dict, repr=False)  # RecordIndex per ID'd list field
+
+    # 📸 Versioning for snapshot(): bumped once per _apply()/save(), per-key for cheap rebuilds
+    _version: int = field(default=0, repr=False)
+    _key_versions: Dict[str, int] = field(default_factory=dict, repr=False)
+    _snapshot: Any = field(default=None, repr=False)
+    _epoch: str = field(default_factory=lambda: uuid.uuid4().hex[:8], repr=False)  # Versions restart with the process
+    _listeners: List[Any] = field(default_factory=list, repr=False)
+    _changes: Any = field(default_factory=lambda: ChangeLog(
+        ("task_memory", "appointments"), (Config.get("api", {}) or {}).get("delta_history", 2000)), repr=False)
+
+    # 📒 Persistence store (storage.engine): StateJournal ("journal") or SqliteStateStore
+    # ("sqlite"); None for the legacy full-rewrite "json" engine. `_untracked` is set when
+    # code mutated fields directly and called save(); the next recorded op then writes the
+    # full state first so replay never applies an op on top of a store missing that edit.
+    _store: Any = field(default=None, repr=False)
+    _untracked: bool = field(default=False, repr=False)
+    _lock: Any = field(default_factory=threading.RLock, repr=False)
+
+    @staticmethod
+    def _storage_config():
+        return Config.get("storage", {}) or {}
+
+    @classmethod
+    def _open_store(cls, state_file):
+        cfg = cls._storage_config()
+        engine = cfg.get("engine", "journal")
+        if engine == "journal":
+            return StateJournal(state_file, fsync=cfg.get("fsync", False))
+        if engine == "sqlite":
+            db_path = cfg.get("sqlite_path") or os.path.splitext(state_file)[0] + ".db"
+            return SqliteStateStore(db_path, snapshot_path=state_file)
+        return None
 
     @classmethod
     def load(cls):
         Config.load()
-        if os.path.exists(cls.STATE_FILE):
-            try:
+        store = None
+        try:
+            store = cls._open_store(cls.STATE_FILE)
+            if store:
+                data = store.load()
+            elif os.path.exists(cls.STATE_FILE):
                 with open(cls.STATE_FILE, 'r') as f:
                     data = json.load(f)
-                    valid = {k: v for k, v in data.items() if k in cls.__dataclass_fields__}
-                    return cls(**valid)
-            except Exception as e:
-                print(f"Load Error: {e}")
-        return cls()
+            else:
+                data = None
+            if data is not None:
+                valid = {k: v for k, v in data.items() if k in cls.__dataclass_fields__ and not k.startswith("_")}
+                state = cls(**valid, _store=store)
+                state._assign_missing_ids()
+                return state
+        except Exception as e:
+            print(f"Load Error: {e}")
+        return cls(_store=store, _untracked=store is not None)
+
+    PERSISTED_FIELDS = ("appointments", "task_memory", "chat_history", "settings", "last_focus", "therapy_data")
 
     def to_dict(self):
         return {
@@ -245,92 +517,362 @@ class JarvisState:
             "therapy_data": self.therapy_data
         }
 
+    def _get_store(self):
+        if self._store is None and self._storage_config().get("engine", "journal") != "json":
+            # Built lazily for states created without load(); nothing on disk matches memory yet
+            self._store = self._open_store(self.STATE_FILE)
+            self._untracked = True
+        return self._store
+
+    def _record(self, *ops):
+        """Persists one mutation as a store record (O(change)). Call with self._lock held."""
+        store = self._get_store()
+        if store is None or self._untracked:
+            # Full write (JSON engine, or the store is missing earlier direct edits)
+            self._untracked = True
+            self._schedule_write(immediate=store is not None)
+            return
+        with span("state_save"):
+            store.append(list(ops))
+        if store.records >= int(self._storage_config().get("compact_every", 500)):
+            self._schedule_write()
+
+    def _write(self):
+        """Full write: compacts the store to the current state, or rewrites the JSON file. Returns bytes written."""
+        with self._lock:
+            store = self._get_store()
+            if store: written = store.compact(self.to_dict())
+            else: written = write_json_atomic(self.STATE_FILE, self.to_dict())
+            # Cleared only once the write landed: a failed compact leaves the store behind the direct edits
+            self._untracked = False
+            return written
+
+    def _get_writer(self):
+        with self._lock:
+            if self._writer is None:
+                cfg = self._storage_config()
+                self._writer = StateWriter(self._write, delay=cfg.get("write_delay", 2.0),
+                                           max_latency=cfg.get("max_write_latency", 10.0))
+            return self._writer
+
+    def _schedule_write(self, immediate=False):
+        with span("state_save"):
+            if immediate: self._get_writer().write_now()
+            else: self._get_writer().mark_dirty()
+
     def save(self, immediate=False):
-        def perform_save():
-            try:
-                with open(self.STATE_FILE, "w") as f:
-                    json.dump(self.to_dict(), f, indent=2)
-            except Exception:
-                pass
+        """Persists direct edits to the fields. Mutation methods record their own changes instead."""
+        with self._lock:
+            self._untracked = True
+            self._appt_index = None  # Direct edits bypass the indexes; rebuilt on the next query
+            self._id_index = {}
+            self._bump_version(*self.PERSISTED_FIELDS)
+            for key in self.ID_FIELDS: self._changes.reset(self._version, key)
+            self._notify([])
+        self._schedule_write(immediate)
+
+    def close(self):
+        """Flushes pending writes and releases the store (call on shutdown)."""
+        if self._writer: self._writer.close()
+        with self._lock:
+            if self._store: self._store.close()
+
+    def persistence_stats(self):
+        stats = dict(self._store.stats()) if self._store else {"engine": "json"}
+        if self._writer: stats["writer"] = self._writer.stats()
+        return stats
+
+    def _apply(self, *ops, undoable=True):
+        """
+        The single mutation path: applies ops to the in-memory fields, keeps their
+        inverse for undo and persists them. Cost tracks the change, not the state.
+        """
+        with self._lock:
+            inverse = []
+            index, version = self._appt_index, self._version + 1
+            for op in ops:
+                inverse = invert_op(self.__dict__, op) + inverse
+                ids = self._id_index.get(op["key"])
+                old_len = len(getattr(self, op["key"])) if ids else 0
+                removed = self._changes.removed_ids(self.__dict__, op)
+                if index is not None: index.apply(self.__dict__, op)
+                else: apply_op(self.__dict__, op)
+                if ids: ids.after_op(op, old_len)
+                self._changes.record(version, self.__dict__, op, removed)
+            self._bump_version(*(op["key"] for op in ops))
+            if undoable: self._push_undo(inverse)
+            self._record(*ops)
+            self._notify(ops)
+
+    def set_field(self, key, value):
+        """Replaces one persisted field (e.g. clearing chat history) and journals it."""
+        self._apply({"op": "set", "key": key, "value": value})
+
+    def merge_field(self, key, fields):
+        """dict.update on one persisted dict field (settings, therapy_data) and journals it."""
+        self._apply({"op": "merge", "key": key, "fields": fields})
+
+    def update_item(self, key, index, fields):
+        """dict.update on one item of a list field (a task or appointment)."""
+        self._apply({"op": "update", "key": key, "index": index, "fields": fields})
+
+    def insert_item(self, key, index, item):
+        """list.insert on one list field."""
+        self._apply({"op": "insert", "key": key, "items": [[index, item]]})
+
+    # --- SNAPSHOTS ---
+    @property
+    def version(self):
+        """Incremented on every change; equal versions mean equal state (within one epoch)."""
+        return self._version
+
+    @property
+    def epoch(self):
+        """Identifies this process's version sequence; versions from another epoch are not comparable."""
+        return self._epoch
+
+    def _bump_version(self, *keys):
+        self._version += 1
+        for key in keys: self._key_versions[key] = self._version
+
+    def snapshot(self) -> StateSnapshot:
+        """
+        Consistent, immutable copy of the persisted fields. Cached per version, and
+        only fields changed since the previous snapshot are copied again.
+        """
+        with self._lock:
+            previous = self._snapshot
+            if previous and previous["last_focus"] != self.last_focus:
+                self._bump_version("last_focus")  # Router sets it directly; count it as a change here
+            if previous and previous.version == self._version:
+                return previous
+            built_at = previous.version if previous else -1
+            fields = {}
+            for key in self.PERSISTED_FIELDS:
+                if previous and self._key_versions.get(key, 0) <= built_at and key != "last_focus":
+                    fields[key] = previous[key]
+                else:
+                    fields[key] = _freeze(getattr(self, key))
+            self._snapshot = StateSnapshot(self._version, MappingProxyType(fields))
+            return self._snapshot
+
+    def add_listener(self, fn):
+        """
+        Calls fn(version, ops) after every change (ops is empty for direct edits saved
+        with save()). Runs under the state lock, in the writer's thread: keep it quick.
+        """
+        self._listeners.append(fn)
+
+    def _notify(self, ops):
+        for fn in self._listeners:
+            try: fn(self._version, ops)
+            except Exception as e: print(f"⚠️ State listener failed: {e}")
+
+    def delta(self, since):
+        """
+        What changed after version `since`, as {"version", "since", "changes"}. Tasks and
+        appointments list their upserted records and deleted ids when the change log
+        still covers `since`; any other changed field is sent whole. None when `since`
+        is ahead of this state (it came from another epoch).
+        """
+        with self._lock:
+            snap = self.snapshot()
+            if since > snap.version: return None
+            changes = {}
+            for key in self.PERSISTED_FIELDS:
+                if self._key_versions.get(key, 0) <= since: continue
+                ids = self._changes.since(since, key) if key in self.ID_FIELDS else None
+                if ids is None:
+                    changes[key] = snap.to_dict()[key]
+                else:
+                    upserted, deleted = ids
+                    records = (self.find_record(key, record_id) for record_id in upserted)
+                    changes[key] = {"upserted": [r for r in records if r is not None], "deleted": deleted}
+            return {"version": snap.version, "since": since, "changes": changes}
+
+    # --- RECORDS BY ID ---
+    # Tasks and appointments carry a stable "id"; the REST API addresses them by it.
+    ID_FIELDS = ("task_memory", "appointments")
+
+    def _assign_missing_ids(self):
+        """Gives legacy records an id (persisted with the next full write)."""
+        missing = [r for key in self.ID_FIELDS for r in getattr(self, key) if not r.get("id")]
+        for record in missing: record["id"] = new_record_id()
+        if missing: self.save()
+
+    def _ids(self, key):
+        if key not in self._id_index:
+            self._id_index[key] = RecordIndex(lambda: getattr(self, key))
+        return self._id_index[key]
+
+    def find_record(self, key, record_id):
+        """The task/appointment with this id, or None. O(1)."""
+        with self._lock:
+            i = self._ids(key).position(record_id)
+            return None if i is None else getattr(self, key)[i]
+
+    def update_record(self, key, record_id, fields):
+        with self._lock:
+            i = self._ids(key).position(record_id)
+            if i is None: return False
+            self.update_item(key, i, fields)
+            return True
 
-        if immediate: perform_save()
-        else:
-            if self._save_timer: self._save_timer.cancel()
-            self._save_timer = threading.Timer(2.0, perform_save)
-            self._save_timer.start()
+    def update_records(self, key, record_ids, fields):
+        """Applies the same fields to each record in one journal record. Returns the ids found."""
+        with self._lock:
+            found = self._ids(key).positions(record_ids)
+            if found:
+                self._apply(*({"op": "update", "key": key, "index": i, "fields": dict(fields)} for i in sorted(found.values())))
+            return list(found)
+
+    def remove_records(self, key, record_ids):
+        """Deletes records by id in one remove op. Returns the ids found."""
+        with self._lock:
+            found = self._ids(key).positions(record_ids)
+            self.remove_indices(key, found.values())
+            return list(found)
+
+    def remove_indices(self, key, indices):
+        """Deletes items of a list field by position."""
+        indices = sorted(set(indices))
+        if indices: self._apply({"op": "remove", "key": key, "indices": indices})
+        return len(indices)
+
+    # --- UNDO ---
+    # Each undo step holds the inverse ops of every change recorded since save_snapshot()
+    # opened it, so memory and CPU per step track the change rather than the state.
+    @staticmethod
+    def _undo_config():
+        cfg = Config.get("undo", {}) or {}
+        return int(cfg.get("depth", 15)), int(cfg.get("max_bytes", 2_000_000))
+
+    def _push_undo(self, inverse):
+        if not self._undo_stack or not inverse: return
+        step = self._undo_stack[-1]
+        step["ops"].append(inverse)
+        step["bytes"] += len(json.dumps(inverse, default=str))
+        _, max_bytes = self._undo_config()
+        while sum(s["bytes"] for s in self._undo_stack) > max_bytes and len(self._undo_stack) > 1:
+            self._undo_stack.pop(0)
+        if step["bytes"] > max_bytes:
+            self._undo_stack.clear()  # A single change larger than the cap cannot be undone
 
     def save_snapshot(self):
-        if len(self._undo_stack) > 15: self._undo_stack.pop(0)
-        self._undo_stack.append(copy.deepcopy(self.to_dict()))
+        """Marks an undo point: restore_snapshot() reverts every change made after it."""
+        with self._lock:
+            if self._undo_stack and not self._undo_stack[-1]["ops"]: return  # Nothing changed since the last mark
+            depth, _ = self._undo_config()
+            self._undo_stack.append({"ops": [], "bytes": 0})
+            while len(self._undo_stack) > depth: self._undo_stack.pop(0)
 
     def restore_snapshot(self):
-        if not self._undo_stack: return False
-        prev = self._undo_stack.pop()
-        for k, v in prev.items(): setattr(self, k, v)
-        self.save(immediate=True)
-        return True
+        with self._lock:
+            while self._undo_stack and not self._undo_stack[-1]["ops"]:
+                self._undo_stack.pop()
+            if not self._undo_stack: return False
+            step = self._undo_stack.pop()
+            for inverse in reversed(step["ops"]):
+                self._apply(*inverse, undoable=False)
+            return True
 
     # --- TASK & APPOINTMENT LOGIC ---
     def update_tasks(self, tasks_list, priority='medium', depends_on=None):
         self.save_snapshot()
         priority = priority if priority in ['low', 'medium', 'high', 'urgent'] else 'medium'
-        for t in tasks_list:
-            self.task_memory.append({
-                "id": str(uuid.uuid4())[:8],
-                "text": t,
-                "status": "open",
-                "priority": priority,
-                "depends_on": depends_on or [],
-                "created_at": datetime.now().isoformat(),
-                "completed": False
-            })
-        self.save()
+        new_tasks = [{
+            "id": new_record_id(),
+            "text": t,
+            "status": "open",
+            "priority": priority,
+            "depends_on": depends_on or [],
+            "created_at": datetime.now().isoformat(),
+            "completed": False
+        } for t in tasks_list]
+        self._apply({"op": "extend", "key": "task_memory", "values": new_tasks})
 
     def edit_task(self, index, text=None, priority=None):
         if 0 <= index < len(self.task_memory):
             self.save_snapshot()
-            if text: self.task_memory[index]["text"] = text
-            if priority: self.task_memory[index]["priority"] = priority
-            self.save(immediate=True)
+            fields = {}
+            if text: fields["text"] = text
+            if priority: fields["priority"] = priority
+            self.update_item("task_memory", index, fields)
             return True
         return False
 
+    def remove_where(self, key, keep):
+        """Drops the items of list field `key` for which keep(item) is False; journals their positions."""
+        with self._lock:
+            return self.remove_indices(key, [i for i, item in enumerate(getattr(self, key)) if not keep(item)])
+
     def remove_task(self, text):
         self.save_snapshot()
-        original_len = len(self.task_memory)
-        self.task_memory = [t for t in self.task_memory if text.lower() not in t['text'].lower()]
-        self.save()
-        return original_len - len(self.task_memory)
+        return self.remove_where("task_memory", lambda t: text.lower() not in t['text'].lower())
 
     def add_appointment(self, time, title, date, location=None, people=None):
-        self.save_snapshot()
-        self.appointments.append({
-            "time": time, "title": title, "date": date, 
+        """Raises ValueError if `date` is not a date (see iso_date)."""
+        day = iso_date(date)
+        if day is None: raise ValueError(f"Invalid appointment date: {date!r}")
+        date = day
+        appt = {
+            "id": new_record_id(), "time": time, "title": title, "date": date,
             "location": location, "people": people or []
-        })
-        self.deduplicate()
-        self.save()
+        }
+        with self._lock:
+            # Only the appointment's own day can hold a duplicate of it
+            if any(a.get("time") == time and a.get("title") == title for a in self.appointments_on(date)): return
+            # Undo point only once there is something to undo
+            self.save_snapshot()
+            self._apply({"op": "append", "key": "appointments", "value": appt})
 
     def remove_appointment(self, title, date=None):
         self.save_snapshot()
-        original_len = len(self.appointments)
         if date:
-            self.appointments = [a for a in self.appointments 
-                                if not (title.lower() in a['title'].lower() and a['date'] == date)]
+            keep = lambda a: not (title.lower() in a['title'].lower() and a['date'] == date)
         else:
-            self.appointments = [a for a in self.appointments 
-                                if title.lower() not in a['title'].lower()]
-        self.save()
-        return original_len - len(self.appointments)
+            keep = lambda a: title.lower() not in a['title'].lower()
+        return self.remove_where("appointments", keep)
 
     def deduplicate(self):
         seen = set()
-        unique = []
-        for a in self.appointments:
+        def keep(a):
             key = (a.get("date"), a.get("time"), a.get("title"))
-            if key not in seen:
-                seen.add(key); unique.append(a)
-        self.appointments = unique
+            if key in seen: return False
+            seen.add(key)
+            return True
+        self.remove_where("appointments", keep)
+
+    # --- QUERIES ---
+    def _indexed_store(self):
+        """The store, when it can answer queries and holds every change made so far."""
+        store = self._store
+        return store if store is not None and hasattr(store, "open_tasks") and not self._untracked else None
+
+    def appointment_index(self):
+        """The (date, time) index over appointments, built on first use and kept current by _apply()."""
+        with self._lock:
+            if self._appt_index is None:
+                self._appt_index = AppointmentIndex(self.appointments)
+            return self._appt_index
+
+    def appointments_between(self, start_date, end_date):
+        """Appointments with start_date <= date <= end_date (ISO date strings), ordered by date and time."""
+        with self._lock:
+            return self.appointment_index().between(start_date, end_date)
+
+    def appointments_on(self, date):
+        return self.appointments_between(date, date)
+
+    def appointments_after(self, ts, until=None):
+        """(datetime, appointment) pairs starting after `ts` (and before `until`), soonest first."""
+        with self._lock:
+            return list(self.appointment_index().next_after(ts, until))
+
+    def open_tasks(self):
+        store = self._indexed_store()
+        if store: return store.open_tasks()
+        return [t for t in self.task_memory if not t.get('completed')]
 
     def log_chat(self, role, content):
         ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])|\[\d+m')
@@ -342,10 +884,11 @@ class JarvisState:
         if clean.lower() in [n.lower() for n in noise] or not clean:
             return
 
-        self.chat_history.append({"role": role, "content": clean})
-        if len(self.chat_history) > 50:
-            self.chat_history.pop(0)
-        self.save()
+        with self._lock:
+            ops = [{"op": "append", "key": "chat_history", "value": {"role": role, "content": clean}}]
+            if len(self.chat_history) >= 50:
+                ops.append({"op": "trim", "key": "chat_history", "count": len(self.chat_history) - 49})
+            self._apply(*ops)
 
 # ============================================================
 # --- INTELLIGENCE ENGINES ---
@@ -405,8 +948,8 @@ class ContextEngine:
                         if any(m in prev for m in markers): return True
         return False
 
-    def get_cleaned_history(self, max_messages: int = 12) -> List[Dict[str, str]]:
-        history = self.state.chat_history
+    def get_cleaned_history(self, max_messages: int = 12, history=None) -> List[Dict[str, str]]:
+        history = self.state.chat_history if history is None else history
         recent = history[-max_messages:] if len(history) > max_messages else history.copy()
         if self.should_suppress_context():
             recent.append({'role': 'system', 'content': '[SYSTEM: User declined suggestions. Do not repeat them.]'})
@@ -415,16 +958,122 @@ class ContextEngine:
     def get_proactive_suggestions(self):
         suggestions = []
         now = datetime.now()
-        for appt in self.state.appointments:
-            try:
-                target = datetime.fromisoformat(f"{appt['date']}T{appt['time']}")
-                diff = (target - now).total_seconds()
-                if 0 < diff < 1800: suggestions.append(f"⏰ {appt['title']} in {int(diff/60)}m")
-            except: continue
-        open_tasks = [t for t in self.state.task_memory if not t.get('completed')]
+        soon = now + timedelta(minutes=30)
+        for target, appt in self.state.appointments_after(now, until=soon):
+            suggestions.append(f"⏰ {appt['title']} in {int((target - now).total_seconds() / 60)}m")
+        open_tasks = self.state.open_tasks()
         if len(open_tasks) > 10: suggestions.append(f"⚠️ High load: {len(open_tasks)} tasks")
         return suggestions
 
+# ============================================================
+# --- REQUEST CONTEXT ---
+# ============================================================
+
+_current_request = contextvars.ContextVar("jarvis_request", default=None)
+
+@dataclass
+class RequestContext:
+    """Per-command output channel: everything shown to the user while handling one command."""
+    text: str
+    request_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+    verdict: str = "Routine"
+    started_at: float = field(default_factory=time.time)
+    trace: Any = None  # tracing.Trace when request tracing is enabled
+    on_token: Any = None  # Callable fed each streamed reply token (e.g. /api/command/stream)
+    stream_to_ui: bool = True  # Also stream tokens to the console UI (False for API commands)
+    streamed: List[str] = field(default_factory=list)  # Tokens of the reply being streamed
+
+    @staticmethod
+    def current():
+        return _current_request.get()
+
+    @property
+    def reply(self):
+        return "\n".join(RequestUI.render(m) for m in self.messages)
+
+    def to_dict(self):
+        data = {"request_id": self.request_id, "verdict": self.verdict, "reply": self.reply, "messages": self.messages}
+        if self.trace is not None: data["timings_ms"] = self.trace.durations()
+        return data
+
+class RequestUI:
+    """
+    UI proxy handed to the skills. Each message is recorded on the calling
+    thread's RequestContext and then forwarded to the real UI, so concurrent
+    commands never see each other's output and nothing swaps sys.stdout.
+    """
+    PREFIX = {"say": "", "success": "✅ ", "error": "❌ ", "alert": "🔔 ", "system": "⚙️ SYSTEM › "}
+
+    def __init__(self, ui):
+        self.ui = ui
+
+    @classmethod
+    def render(cls, message):
+        """Plain-text form of a message as the CLI shows it (markdown bold dropped)."""
+        return cls.PREFIX.get(message["kind"], "") + re.sub(r'\*\*(.*?)\*\*', r'\1', message["text"])
+
+    def _emit(self, kind, text, state=None):
+        ctx = _current_request.get()
+        if ctx is not None:
+            # A UI call that receives `state` writes chat history itself
+            ctx.messages.append({"kind": kind, "text": text, "logged": state is not None})
+            if kind == "say" and ctx.streamed:
+                # The reply the tokens belonged to: the console completes its line instead of reprinting it
+                streamed, ctx.streamed = "".join(ctx.streamed), []
+                end_stream = getattr(self.ui, "end_stream", None) if ctx.stream_to_ui else None
+                if end_stream is not None:
+                    return end_stream(text, streamed, state) if state is not None else end_stream(text, streamed)
+        method = getattr(self.ui, kind, None)
+        if method is None: return
+        return method(text, state) if state is not None else method(text)
+
+    def say(self, text, state=None): return self._emit("say", text, state)
+    def success(self, text, state=None): return self._emit("success", text, state)
+    def error(self, text, state=None): return self._emit("error", text, state)
+    def alert(self, text, state=None): return self._emit("alert", text, state)
+    def system(self, text): return self._emit("system", text)
+
+    def stream(self, token):
+        """
+        One token of a reply still being generated. Goes to the request's
+        `on_token` sink and to the console UI; the finished reply arrives
+        through say() as usual and is recorded (and logged) once.
+        """
+        ctx = _current_request.get()
+        if ctx is None: return
+        if not ctx.streamed:
+            token = token.lstrip()
+            if not token: return
+        ctx.streamed.append(token)
+        if ctx.on_token is not None: ctx.on_token(token)
+        method = getattr(self.ui, "stream", None) if ctx.stream_to_ui else None
+        if method is not None: method(token, len(ctx.streamed) == 1)
+
+    def __getattr__(self, name):
+        return getattr(self.ui, name)
+
+class TokenGate:
+    """
+    Token sink for a speculative reply: tokens are held until the turn's
+    verdict allows the reply, then open() flushes them to the real sink and
+    passes later ones straight through. A blocked turn never opens the gate.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._held = []
+        self._sink = None
+
+    def __call__(self, token):
+        with self._lock:
+            if self._sink is None: self._held.append(token)
+            else: self._sink(token)
+
+    def open(self, sink):
+        with self._lock:
+            for token in self._held: sink(token)
+            self._held, self._sink = [], sink
+
 # ============================================================
 # --- MAIN ROUTER ---
 # ============================================================
@@ -432,7 +1081,8 @@ class ContextEngine:
 class JarvisRouter:
     def __init__(self, state: JarvisState, ui):
         self.state = state
-        self.ui = ui
+        self.ui = RequestUI(ui)
+        ui = self.ui  # Skills get the proxy too
         self.nlp = NLPProcessor()
         self.context = ContextEngine(state)
         
@@ -440,6 +1090,7 @@ class JarvisRouter:
         self.forensics = None
         self.using_advanced_forensics = False
         self.internal_safety_net = InternalForensicReasoner(self.state) # Always initialized
+        self.security_pipeline = None
         
         try:
             # Try importing external advanced forensic engine
@@ -450,12 +1101,35 @@ class JarvisRouter:
                 
             self.forensics = adv_forensics.ForensicReasoner(self.state)
             self.using_advanced_forensics = True
+            self.security_pipeline = SecurityPipeline(self.forensics, self.internal_safety_net)
             print("✅ FPMv5-Ultima: Advanced Forensic Reasoner Attached & Active")
         except Exception as e:
             print(f"⚠️ FPMv5 Not Found ({e}) - Reverting to Internal Basic Security")
             self.forensics = self.internal_safety_net
             self.using_advanced_forensics = False
 
+        # --- EXECUTION MODE ---
+        # "concurrent" overlaps security stages with skill matching and, for chat-bound
+        # turns, starts the LLM call speculatively (discarded if the turn is blocked)
+        exec_cfg = Config.get("execution", {}) or {}
+        self.concurrent = exec_cfg.get("mode", "serial") == "concurrent"
+        self.speculative_llm = self.concurrent and exec_cfg.get("speculative_llm", True)
+        self.executor = None
+        if self.concurrent:
+            self.executor = ThreadPoolExecutor(max_workers=int(exec_cfg.get("workers", 4)), thread_name_prefix="jarvis-exec")
+
+        # Per-stage concurrency caps: many requests may screen at once, few should hit the LLM
+        stage_cfg = exec_cfg.get("stages", {}) or {}
+        self.stages = {
+            "security": StageLimiter("security", stage_cfg.get("security", 4)),
+            "llm": StageLimiter("llm", stage_cfg.get("llm", 1))
+        }
+
+        # --- TRACING ---
+        # Per-request stage spans, kept in a ring buffer for /api/metrics/traces
+        trace_cfg = Config.get("tracing", {}) or {}
+        self.tracer = Tracer(capacity=trace_cfg.get("buffer_size", 256), enabled=trace_cfg.get("enabled", True))
+
         # --- PERSONALITY LOADING ---
         self.therapy = None
         self.humor = None
@@ -506,46 +1180,121 @@ class JarvisRouter:
             }
             # Remove Nones
             self.skills = {k: v for k, v in self.skills.items() if v is not None}
+            if chat_skill is not None: chat_skill.llm_stage = self.stages["llm"]
             
         except ImportError as e:
             print(f"⚠️ Skill import failed: {e}")
 
-    def _execute_with_logging(self, skill, text):
-        """Executes skill and captures stdout. Returns True if skill produced output."""
-        old_stdout = sys.stdout
-        sys.stdout = captured = io.StringIO()
-        history_len_before = len(self.state.chat_history)
-        produced_output = False
-        
+        # --- INTENT INDEX ---
+        # Every skill trigger plus the router's own keywords, matched in one scan per request
+        self.intents = IntentIndex(
+            {name: skill for name, skill in self.skills.items() if name != "chat"},
+            router_triggers=self.ROUTER_TRIGGERS, state=self.state
+        )
+
+    def metrics(self):
+        """Runtime metrics for /api/metrics (embedding breaker, caches, execution mode, stage latencies)."""
+        data = {"execution": {"mode": "concurrent" if self.concurrent else "serial", "speculative_llm": self.speculative_llm},
+                "stages": {name: stage.stats() for name, stage in self.stages.items()},
+                "latency": self.tracer.summary()}
+        if hasattr(self.forensics, "metrics"):
+            data["forensics"] = self.forensics.metrics()
+        data["storage"] = self.state.persistence_stats()
+        data["http"] = http_client().stats()
+        return data
+
+    # Router-level intents, compiled into the IntentIndex alongside the skill triggers
+    ROUTER_TRIGGERS = {
+        "schedule_keyword": {"contains": ["remind", "schedule", "appt"]},
+        "agenda": {"contains": ["week ahead", "agenda", "calendar", "my schedule", "upcoming"]},
+        "index_command": {"regex": r"^(delete|remove|done|complete|finish)\s+\d+$"}
+    }
+
+    def _prefetch_security(self, text, slot):
+        """
+        Concurrent mode: starts the security stages on the executor while the router matches skills.
+        The request takes its security stage slot first and keeps it (in `slot`) until screening is over.
+        """
+        if not self.executor or not self.forensics: return None
+        slot.enter_context(self.stages["security"])
+        if not self.using_advanced_forensics:
+            return {"report": submit(self.executor, traced("security.forensics", self.forensics.analyze), text, accumulator=self.state.threat)}
+        if self.security_pipeline.enabled:
+            return self.security_pipeline.prefetch(text, self.executor)
+        return {"safety": submit(self.executor, traced("security.safety_net", self.internal_safety_net.analyze), text, accumulator=None)}
+
+    def _start_speculative_chat(self, text, intent):
+        """
+        Starts the chat LLM call before the verdict when the turn can only route to chat.
+        Returns (turn, cancel_event, future, token_gate) or None.
+        """
+        chat = self.skills.get("chat")
+        if not self.speculative_llm or intent or intent.flags or not hasattr(chat, "prepare"): return None
+        turn = chat.prepare(text)
+        cancel, gate = threading.Event(), TokenGate()
+        return turn, cancel, submit(self.executor, chat.generate, turn, cancel, gate), gate
+
+    def _execute_with_logging(self, skill, text, run=None):
+        """Executes skill (or `run`, e.g. a speculative reply) and logs its output to chat history. Returns True if skill produced output."""
+        ctx = RequestContext.current()
+        start = len(ctx.messages)
+        history = self.state.chat_history
+
+        with span(f"skill.{self._skill_name(skill)}"):
+            (run or skill.execute)(text)
+
+        produced = ctx.messages[start:]
+        unlogged = [m for m in produced if not m["logged"]]
+        # Skip if the skill replaced the history itself (undo, clear chat, trimming)
+        if unlogged and self.state.chat_history is history:
+            with span("log_chat"):
+                self.state.log_chat("assistant", "\n".join(RequestUI.render(m) for m in unlogged))
+        return bool(produced)
+
+    def _skill_name(self, skill):
+        return next((name for name, s in self.skills.items() if s is skill), type(skill).__name__)
+
+    def route_and_execute(self, text: str, context: RequestContext = None) -> RequestContext:
+        """Handles one command. Returns its RequestContext (verdict, every message shown, stage timings)."""
+        ctx = context or RequestContext(text)
+        token = _current_request.set(ctx)
         try:
-            skill.execute(text)
-            output = captured.getvalue()
-            
-            if output.strip():
-                # IMPORTANT: Print back to real stdout so user sees it in CLI/logs
-                old_stdout.write(output)
-                if len(self.state.chat_history) == history_len_before:
-                    self.state.log_chat("assistant", output)
-                produced_output = True
-                
+            with self.tracer.trace(ctx.request_id, text) as trace:
+                ctx.trace = trace
+                try:
+                    self._route(text, ctx)
+                finally:
+                    if trace is not None: trace.verdict = ctx.verdict
         finally:
-            sys.stdout = old_stdout
-            
-        return produced_output
+            _current_request.reset(token)
+        return ctx
 
-    def route_and_execute(self, text: str):
+    def _route(self, text: str, ctx: RequestContext):
+        speculation = None
+        report = None
+        security_slot = ExitStack()
         try:
             # 0. CHECK BENCHMARK MODE
             # If enabled: Disable Therapy, Humor, and Agenda Hallucinations
             benchmark_mode = Config.get("benchmark_mode", False)
             if benchmark_mode:
                 self.state.last_focus = "neutral" # Prevent 'task' or 'scheduler' hallucination on routine queries
+
+            # Oversized input fails closed before any skill regex or screening rule sees it
+            if len(text) > self.internal_safety_net.limits.max_input_length:
+                print(f"❌ BLOCKED: Input length {len(text)} exceeds screening limit")
+                ctx.verdict = "Blocked"
+                user_msg = "ACCESS DENIED [SECURITY_PROTOCOL]" if benchmark_mode else "Request refused. Input exceeds screening limit."
+                self.ui.error(f"SECURITY ALERT: {user_msg}", self.state)
+                return
             
-            self.state.log_chat("user", text)
+            with span("log_chat"):
+                self.state.log_chat("user", text)
             
             # Personality analysis - SKIP in benchmark mode to prevent pollution
             if self.therapy and not benchmark_mode: 
-                self.therapy.analyze(text)
+                with span("therapy"):
+                    self.therapy.analyze(text)
                 
             low = text.lower()
 
@@ -555,12 +1304,17 @@ class JarvisRouter:
                 self.ui.say("Security threat score reset to 0.0.", self.state)
                 return
 
+            # Concurrent mode: security stages run on the executor during skill matching
+            prefetched = self._prefetch_security(text, security_slot)
+
             # --- PRE-CHECK: DOES THIS MATCH A SAFE SKILL? ---
-            is_valid_skill_command = False
-            for name, skill in self.skills.items():
-                if name != "chat" and skill and skill.match(text):
-                    is_valid_skill_command = True
-                    break
+            # One intent scan serves both this check and command routing below
+            with span("intent_match"):
+                intent = self.intents.match(text)
+            is_valid_skill_command = bool(intent)
+
+            if self.executor:
+                speculation = self._start_speculative_chat(text, intent)
 
             # =======================================================
             # 1. SECURITY & FORENSIC ANALYSIS (Hybrid Strategy)
@@ -569,53 +1323,51 @@ class JarvisRouter:
             verdict = "Routine"
             
             if self.forensics:
-                if self.using_advanced_forensics:
-                    # A. Run Advanced AI Analysis
-                    report = self.forensics.analyze(text, accumulator=self.state.threat)
-                    
-                    # B. Run Internal Safety Net (Keyword Check)
-                    safety_report = self.internal_safety_net.analyze(text, accumulator=None)
-                    
-                    # C. Override Logic
-                    if safety_report.verdict == "High-Risk":
-                        if not benchmark_mode:
-                            print(f"🛡️ SAFETY NET OVERRIDE: {safety_report.reasoning}")
-                        report.verdict = "High-Risk"
-                        report.reasoning = f"{safety_report.reasoning} (Critical Safety Override)"
-                        if self.state.threat.score < 1.0:
-                            self.state.threat.update(1.0)
-                            report.rolling_score = self.state.threat.score
-                    
-                    # Probation Logic (Tuned: Only downgrade if confidence is VERY low < 0.4)
-                    elif report.verdict == "High-Risk" and safety_report.verdict == "Routine":
-                        # DISABLE PROBATION IN BENCHMARK MODE TO REDUCE FALSE NEGATIVES
-                        if benchmark_mode:
-                             report.verdict = "High-Risk"
+                with span("security"), security_slot:
+                    if not prefetched: security_slot.enter_context(self.stages["security"])
+                    if self.using_advanced_forensics:
+                        if self.security_pipeline.enabled:
+                            # A-C. Staged pipeline: cheap deterministic stages first, semantic only if inconclusive
+                            report = self.security_pipeline.evaluate(
+                                text, self.state.threat,
+                                benchmark_mode=benchmark_mode,
+                                facts=prefetched
+                            )
                         else:
-                            semantic = getattr(report, "variables", {}).get("semantic", 0.0)
-                            if semantic < 0.4:
-                                report.verdict = "Monitor"
-                                print(f"🕊️ PROBATIONARY ALLOW: History is bad ({report.rolling_score:.2f}), but input is benign. Reducing threat.")
-                                self.state.threat.score = max(0.0, self.state.threat.score * 0.5)
-
-                    rolling = getattr(report, "rolling_score", self.state.threat.score)
-                    verdict = report.verdict
-                    reasoning = report.reasoning
+                            # A. Run Advanced AI Analysis
+                            with span("security.forensics"):
+                                report = self.forensics.analyze(text, accumulator=self.state.threat)
+                        
+                            # B. Run Internal Safety Net (Keyword Check)
+                            if prefetched: safety_report = prefetched["safety"].result()
+                            else:
+                                with span("security.safety_net"):
+                                    safety_report = self.internal_safety_net.analyze(text, accumulator=None)
+                        
+                            # C. Override & Probation Logic
+                            self.security_pipeline.apply_safety_net(report, safety_report, self.state.threat, benchmark_mode)
+
+                        rolling = getattr(report, "rolling_score", self.state.threat.score)
+                        verdict = report.verdict
+                        reasoning = report.reasoning
                     
-                    if verdict == "High-Risk":
-                         # SANITIZED LOGGING FOR BENCHMARK
-                         if not benchmark_mode:
-                             print(f"❌ BLOCKED: Rolling:{rolling:.2f} | Final Verdict:{verdict}")
-                         else:
-                             print(f"❌ [BENCHMARK] BLOCKED")
+                        if verdict == "High-Risk":
+                             # SANITIZED LOGGING FOR BENCHMARK
+                             if not benchmark_mode:
+                                 print(f"❌ BLOCKED: Rolling:{rolling:.2f} | Final Verdict:{verdict}")
+                             else:
+                                 print(f"❌ [BENCHMARK] BLOCKED")
                 
-                else:
-                    report = self.forensics.analyze(text, accumulator=self.state.threat)
-                    rolling = self.state.threat.score
-                    verdict = report.verdict
-                    reasoning = report.reasoning
-                    if not benchmark_mode:
-                        print(f"🔍 FPM (Basic): Rolling:{rolling:.2f} | Verdict:{verdict}")
+                    else:
+                        if prefetched: report = prefetched["report"].result()
+                        else:
+                            with span("security.forensics"):
+                                report = self.forensics.analyze(text, accumulator=self.state.threat)
+                        rolling = self.state.threat.score
+                        verdict = report.verdict
+                        reasoning = report.reasoning
+                        if not benchmark_mode:
+                            print(f"🔍 FPM (Basic): Rolling:{rolling:.2f} | Verdict:{verdict}")
 
                 # D. Block Action & OUTPUT GATE
                 # "Detection ≠ Disclosure" - Do not explain the decode to the user if High Risk.
@@ -636,18 +1388,26 @@ class JarvisRouter:
                     blocked = True
 
                 if blocked:
+                    ctx.verdict = "Blocked"
                     # OUTPUT GATE: Sanitize reasoning for the user UI
                     user_msg = "Request refused. Security violation detected."
                     if benchmark_mode:
                         user_msg = "ACCESS DENIED [SECURITY_PROTOCOL]" # No decoding, no explanation
                     
                     self.ui.error(f"SECURITY ALERT: {user_msg}", self.state)
+                    if speculation and Config.get("enable_fpm_debug", False) and not benchmark_mode:
+                        print("⚡ Speculative LLM reply discarded (request blocked)")
                     
+                    # An early-exit verdict is shown first; its accumulator update needs the semantic score
+                    if self.security_pipeline and self.security_pipeline.settle(report):
+                        rolling = report.rolling_score
                     if rolling > 2.5: 
                         self.state.threat.reset()
                         print("⚠️ Threat score auto-reset from >2.5")
                     return
 
+            ctx.verdict = verdict
+
             # =======================================================
             # 2. RESPONSE CONTRACT (AUTHORITY FIX)
             # =======================================================
@@ -664,14 +1424,15 @@ class JarvisRouter:
             # =======================================================
             # 3. COMMAND ROUTING
             # =======================================================
-            parsed_time = self.nlp.parse_time(text)
-            if parsed_time and any(kw in low for kw in ["remind", "schedule", "appt"]):
+            with span("parse_time"):
+                parsed_time = self.nlp.parse_time(text)
+            if parsed_time and "schedule_keyword" in intent.flags:
                 if "scheduler" in self.skills:
                     self._execute_with_logging(self.skills["scheduler"], text)
                     return
             
             # --- FIX: Explicitly route schedule queries to prevent Hallucinations ---
-            if any(phrase in low for phrase in ["week ahead", "agenda", "calendar", "my schedule", "upcoming"]):
+            if "agenda" in intent.flags:
                 if "scheduler" in self.skills:
                     self.state.last_focus = "schedule"
                     
@@ -688,25 +1449,38 @@ class JarvisRouter:
                     self.ui.say("You have no upcoming appointments found in the system.", self.state)
                     return
 
-            if re.match(r"^(delete|remove|done|complete|finish)\s+\d+$", low):
+            if "index_command" in intent.flags:
                 focus = "scheduler" if self.state.last_focus == "schedule" else "tasks"
                 if focus in self.skills:
                     self._execute_with_logging(self.skills[focus], text)
                     return
 
-            for name, skill in self.skills.items():
-                if name != "chat" and skill.match(text):
-                    if name == "tasks": self.state.last_focus = "tasks"
-                    if name == "scheduler": self.state.last_focus = "schedule"
-                    self._execute_with_logging(skill, text)
-                    return
+            if intent:
+                if intent.skill == "tasks": self.state.last_focus = "tasks"
+                if intent.skill == "scheduler": self.state.last_focus = "schedule"
+                self._execute_with_logging(self.skills[intent.skill], text)
+                return
 
             if "chat" in self.skills:
-                self._execute_with_logging(self.skills["chat"], text)
+                if speculation:
+                    # The LLM call has been running since before the verdict
+                    chat, (turn, _, reply, gate) = self.skills["chat"], speculation
+                    sink = chat.token_sink() if hasattr(chat, "token_sink") else None
+                    if sink: gate.open(sink)  # Cleared: show what it has produced so far, then stream on
+                    self._execute_with_logging(chat, text, run=lambda t: chat.finish(turn, reply.result()))
+                else:
+                    self._execute_with_logging(self.skills["chat"], text)
 
         except Exception as e:
             self.ui.error(f"Router Error: {e}", self.state)
             traceback.print_exc()
+        finally:
+            security_slot.close()
+            if report is not None and self.security_pipeline: self.security_pipeline.settle(report)
+            # Abandon a speculative reply the turn did not use (no-op once it completed)
+            if speculation:
+                speculation[1].set()
+                speculation[2].cancel()
 class MockUI:
     # Adding 'state=None' makes it an optional keyword argument
     def say(self, msg, state=None): 
@@ -2,24 +2,35 @@ import sys
 import os
 import time
 import io
+import json
+import math
+import queue
 import threading
 import socket
 import traceback
 import logging
-from datetime import datetime
-from flask import Flask, jsonify, request, send_from_directory
+from datetime import datetime, timedelta
+from flask import Flask, Response, jsonify, request, send_from_directory
 from flask_cors import CORS
 
 # Absolute path resolution for reliability
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, BASE_DIR)
 
-from jarvis_core import JarvisRouter, JarvisState, NotificationService, Config, ContextEngine, NLPProcessor
+from jarvis_core import JarvisRouter, JarvisState, NotificationService, Config, ContextEngine, NLPProcessor, RequestContext
 from jarvis_ui import JarvisUI
+try:
+    from core.job_queue import JobQueue, QueueFullError, QueueClosedError
+    from core.event_bus import EventBus
+    from core.appointment_index import iso_date
+except ImportError:
+    from job_queue import JobQueue, QueueFullError, QueueClosedError
+    from event_bus import EventBus
+    from appointment_index import iso_date
 
 # --- WEB BRIDGE INTEGRATION ---
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["ETag"])  # The dashboard reads ETag for conditional polling
 
 # Silence Flask/Werkzeug request logging to hide API polling spam
 log = logging.getLogger('werkzeug')
@@ -29,19 +40,23 @@ app.logger.disabled = True
 shared_router = None
 shared_state = None
 shared_ui = None
+command_queue = None
+event_bus = None
+suggestions_wake = threading.Event()  # Set on state changes so suggestions are recomputed promptly
 start_time = time.time()
 
 # --- CONTEXT ENGINE HELPERS ---
 
-def cleanup_declined_context(chat_history: list, user_message: str) -> None:
+def cleanup_declined_context(state, user_message: str) -> None:
     """When user declines suggestions, mark the context to prevent LLM re-suggestions."""
     negative_responses = ['no', 'nope', 'nah', 'cancel', 'nevermind', 'never mind', "don't", 'stop', 'forget it']
     if user_message.lower().strip() in negative_responses:
         # Find the last assistant message and insert a hidden system instruction
+        chat_history = state.chat_history
         for i in range(len(chat_history) - 1, -1, -1):
             msg = chat_history[i]
             if msg.get('role') == 'assistant':
-                chat_history.insert(i + 1, {
+                state.insert_item("chat_history", i + 1, {
                     'role': 'system',
                     'content': '[User declined these suggestions - do not reference them again]'
                 })
@@ -138,7 +153,8 @@ def add_headers(response):
     response.headers['X-Frame-Options'] = 'DENY'
     response.headers['X-XSS-Protection'] = '1; mode=block'
     if request.path.startswith('/api/'):
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+        # Versioned responses may be kept but must be revalidated (If-None-Match -> 304)
+        response.headers['Cache-Control'] = 'no-cache' if response.get_etag()[0] else 'no-cache, no-store, must-revalidate'
     return response
 
 @app.errorhandler(Exception)
@@ -153,18 +169,91 @@ def handle_error(error):
 def serve_dashboard():
     return send_from_directory(BASE_DIR, "dashboard.html")
 
+_state_body = (None, b"")  # (etag, serialized /api/state) for the latest version
+
+def _state_etag(version):
+    return f"{shared_state.epoch}-{version}"
+
+def _versioned_json(payload, etag):
+    response = app.response_class(payload, mimetype="application/json")
+    response.set_etag(etag)
+    return response
+
 @app.route('/api/state', methods=['GET'])
 def get_state():
-    """Returns current system state as JSON."""
+    """
+    Returns current system state as JSON, tagged with its version. Clients
+    sending the ETag back in If-None-Match get a 304 while nothing changed, and
+    the body is serialized once per version however many dashboards poll.
+    """
+    global _state_body
+    if not shared_state: return jsonify({"error": "Offline"}), 500
+    # A snapshot, so concurrent commands can't change the lists mid-serialization
+    snap = shared_state.snapshot()
+    etag = _state_etag(snap.version)
+    if request.if_none_match.contains(etag):
+        return _versioned_json(b"", etag), 304
+    cached_etag, body = _state_body
+    if cached_etag != etag:
+        body = json.dumps(dict(snap.to_dict(), version=snap.version, epoch=shared_state.epoch)).encode("utf-8")
+        _state_body = (etag, body)
+    return _versioned_json(body, etag), 200
+
+@app.route('/api/state/delta', methods=['GET'])
+def get_state_delta():
+    """
+    Changes since ?since=<version> (from an earlier /api/state or delta in the same
+    ?epoch=). Falls back to the full state ("full": true) when the version is from
+    another run or too old for the change log.
+    """
     if not shared_state: return jsonify({"error": "Offline"}), 500
-    return jsonify({
-        'appointments': shared_state.appointments,
-        'task_memory': shared_state.task_memory,
-        'chat_history': shared_state.chat_history,
-        'settings': shared_state.settings,
-        'last_focus': shared_state.last_focus,
-        'therapy_data': shared_state.therapy_data
-    }), 200
+    since = request.args.get("since", type=int)
+    if since is None: return jsonify({"error": "since=<version> required"}), 400
+    delta = shared_state.delta(since) if request.args.get("epoch", shared_state.epoch) == shared_state.epoch else None
+    if delta is None:
+        snap = shared_state.snapshot()
+        delta = {"version": snap.version, "full": True, "state": snap.to_dict()}
+    else:
+        delta["full"] = False
+    delta["epoch"] = shared_state.epoch
+    etag = _state_etag(delta["version"])
+    if request.if_none_match.contains(etag):
+        return _versioned_json(b"", etag), 304
+    return _versioned_json(json.dumps(delta), etag), 200
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Returns runtime metrics (embedding circuit breaker, caches, execution mode)."""
+    if not shared_router: return jsonify({"error": "Offline"}), 500
+    data = shared_router.metrics()
+    if command_queue: data["command_queue"] = command_queue.stats()
+    if event_bus: data["events"] = event_bus.stats()
+    return jsonify(data)
+
+@app.route('/api/events', methods=['GET'])
+def stream_events():
+    """
+    Server-Sent Events: "state" (new version + changed fields), "chat" (each new
+    message), "suggestions" and "verdict" (per command), pushed as they happen.
+    Reconnects resume after Last-Event-ID; a "reset" event means reload in full.
+    """
+    if not event_bus: return jsonify({"error": "Offline"}), 503
+    max_clients = (Config.get("events", {}) or {}).get("max_clients", 16)
+    if event_bus.subscribers >= max_clients:
+        response = jsonify({"error": "Too many event streams; poll /api/state instead"})
+        response.headers["Retry-After"] = "30"
+        return response, 503
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("lastEventId")
+    return Response(event_bus.stream(last_id), mimetype="text/event-stream",
+                    headers={"X-Accel-Buffering": "no"})
+
+@app.route('/api/metrics/traces', methods=['GET'])
+def get_traces():
+    """Recent per-request stage spans (newest last) plus per-stage p50/p95. `?limit=N` caps the list."""
+    if not shared_router: return jsonify({"error": "Offline"}), 500
+    tracer = shared_router.tracer
+    traces = tracer.recent(request.args.get("limit", default=50, type=int))
+    return jsonify({"enabled": tracer.enabled, "summary": tracer.summary(), "traces": [t.to_dict() for t in traces]})
 
 @app.route('/api/suggestions')
 def get_suggestions():
@@ -185,6 +274,21 @@ def parse_natural_time():
         })
     return jsonify({"success": False, "error": "Could not parse time"})
 
+def resolve_record_ids(key, refs):
+    """
+    Record ids for the given references. Records are addressed by their "id";
+    a bare integer that matches no id is still accepted as a list position
+    (the pre-ID API) for older clients.
+    """
+    ids = []
+    for ref in refs:
+        ref = str(ref)
+        if shared_state.find_record(key, ref) is not None: ids.append(ref)
+        elif ref.isdigit():
+            items = getattr(shared_state, key)
+            if int(ref) < len(items) and items[int(ref)].get("id"): ids.append(items[int(ref)]["id"])
+    return ids
+
 @app.route('/api/tasks/batch', methods=['POST'])
 def batch_task_operations():
     if not shared_state: return jsonify({"error": "Offline"}), 500
@@ -195,12 +299,10 @@ def batch_task_operations():
         return jsonify({"status": "created"})
     elif action in ["delete", "complete"]:
         shared_state.save_snapshot()
-        for t_id in sorted(data.get("ids", []), reverse=True):
-            if 0 <= t_id < len(shared_state.task_memory):
-                if action == "delete": shared_state.task_memory.pop(t_id)
-                else: shared_state.task_memory[t_id]["completed"] = True
-        shared_state.save()
-        return jsonify({"status": action + "d"})
+        ids = resolve_record_ids("task_memory", data.get("ids", []))
+        if action == "delete": done = shared_state.remove_records("task_memory", ids)
+        else: done = shared_state.update_records("task_memory", ids, {"completed": True})
+        return jsonify({"status": action + "d", "ids": done})
     return jsonify({"error": "Invalid action"}), 400
 
 @app.route('/api/tasks', methods=['POST'])
@@ -212,21 +314,23 @@ def create_task():
     shared_state.update_tasks([text], priority=data.get("priority", "medium"))
     return jsonify({"status": "created", "task": text}), 201
 
-@app.route('/api/tasks/<int:task_id>', methods=['PATCH'])
+@app.route('/api/tasks/<task_id>', methods=['PATCH'])
 def edit_task_endpoint(task_id):
     if not shared_state: return jsonify({"error": "Offline"}), 500
-    if task_id < 0 or task_id >= len(shared_state.task_memory): return jsonify({"error": "Not found"}), 404
+    ids = resolve_record_ids("task_memory", [task_id])
+    if not ids: return jsonify({"error": "Not found"}), 404
     data = request.json
-    success = shared_state.edit_task(task_id, text=data.get("text"), priority=data.get("priority"))
-    return jsonify({"status": "updated" if success else "failed"}), 200 if success else 500
+    fields = {key: data[key] for key in ["text", "priority"] if data.get(key)}
+    shared_state.save_snapshot()
+    success = shared_state.update_record("task_memory", ids[0], fields)
+    return jsonify({"status": "updated" if success else "failed", "id": ids[0]}), 200 if success else 404
 
-@app.route('/api/tasks/<int:task_id>', methods=['DELETE'])
+@app.route('/api/tasks/<task_id>', methods=['DELETE'])
 def delete_task_endpoint(task_id):
     if not shared_state: return jsonify({"error": "Offline"}), 500
-    if task_id < 0 or task_id >= len(shared_state.task_memory): return jsonify({"error": "Not found"}), 404
     shared_state.save_snapshot()
-    shared_state.task_memory.pop(task_id)
-    shared_state.save()
+    if not shared_state.remove_records("task_memory", resolve_record_ids("task_memory", [task_id])):
+        return jsonify({"error": "Not found"}), 404
     return jsonify({"status": "deleted"}), 200
 
 @app.route('/api/appointments', methods=['POST'])
@@ -235,73 +339,203 @@ def create_appointment():
     data = request.json
     title, date, time_val = data.get("title", ""), data.get("date", ""), data.get("time", "")
     if not title or not date or not time_val: return jsonify({"error": "Missing fields"}), 400
-    shared_state.add_appointment(time_val, title, date, location=data.get("location", "Home"))
+    if iso_date(date) is None: return jsonify({"error": "date must be YYYY-MM-DD"}), 400
+    shared_state.add_appointment(time_val, title, iso_date(date), location=data.get("location", "Home"))
     return jsonify({"status": "created"}), 201
 
-@app.route('/api/appointments/<int:appt_id>', methods=['PUT'])
+@app.route('/api/appointments/<appt_id>', methods=['PUT'])
 def edit_appointment_endpoint(appt_id):
     if not shared_state: return jsonify({"error": "Offline"}), 500
-    if appt_id < 0 or appt_id >= len(shared_state.appointments): return jsonify({"error": "Not found"}), 404
+    ids = resolve_record_ids("appointments", [appt_id])
+    if not ids: return jsonify({"error": "Not found"}), 404
     data = request.json
+    if "date" in data:
+        if iso_date(data["date"]) is None: return jsonify({"error": "date must be YYYY-MM-DD"}), 400
+        data = dict(data, date=iso_date(data["date"]))
     shared_state.save_snapshot()
-    for key in ["title", "date", "time", "location"]:
-        if key in data: shared_state.appointments[appt_id][key] = data[key]
-    shared_state.save()
-    return jsonify({"status": "updated"}), 200
+    shared_state.update_record("appointments", ids[0], {key: data[key] for key in ["title", "date", "time", "location"] if key in data})
+    return jsonify({"status": "updated", "id": ids[0]}), 200
 
-@app.route('/api/appointments/<int:appt_id>', methods=['DELETE'])
+@app.route('/api/appointments/<appt_id>', methods=['DELETE'])
 def delete_appointment_endpoint(appt_id):
     if not shared_state: return jsonify({"error": "Offline"}), 500
-    if appt_id < 0 or appt_id >= len(shared_state.appointments): return jsonify({"error": "Not found"}), 404
     shared_state.save_snapshot()
-    shared_state.appointments.pop(appt_id)
-    shared_state.save()
+    if not shared_state.remove_records("appointments", resolve_record_ids("appointments", [appt_id])):
+        return jsonify({"error": "Not found"}), 404
     return jsonify({"status": "deleted"}), 200
 
+def schedule_from_context(state, ui, command):
+    """Books appointments the command confirms from recent conversation. Returns the feedback message, or None."""
+    contextual_appts = extract_schedule_from_context(command, state.snapshot()["chat_history"])
+    if not contextual_appts: return None
+    state.save_snapshot()
+    time_groups = {}
+    for appt in contextual_appts:
+        t = appt['time']
+        if t not in time_groups: time_groups[t] = []
+        time_groups[t].append(appt['title'])
+    
+    for t, titles in time_groups.items():
+        state.add_appointment(t, " + ".join(titles[:3]), contextual_appts[0]['date'], location='Home')
+    
+    appt_list = "\n  • ".join([f"{a['time']} - {a['title']}" for a in contextual_appts])
+    msg = f"✅ Scheduled {len(contextual_appts)} items from conversation context:\n  • {appt_list}"
+    ui.say(msg)
+    state.log_chat('assistant', msg)
+    return msg
+
 @app.route('/api/command', methods=['POST'])
 def handle_command():
     """Main API for processing user commands with contextual intelligence."""
     data = request.json
     command = data.get("command", "")
+    if shared_router and len(command) > shared_router.internal_safety_net.limits.max_input_length:
+        return jsonify({"status": "error", "error": "Input exceeds screening limit"}), 413
+    # `wait`: true (60s) or a number of seconds, capped at 120
+    wait = data.get("wait")
+    try:
+        wait = (60.0 if wait else 0.0) if isinstance(wait, bool) or wait is None else min(float(wait), 120.0)
+    except (TypeError, ValueError):
+        wait = math.nan
+    if math.isnan(wait): return jsonify({"status": "error", "error": "wait must be a number of seconds"}), 400
     if shared_router and command:
-        cleanup_declined_context(shared_state.chat_history, command)
-        contextual_appts = extract_schedule_from_context(command, shared_state.chat_history)
+        cleanup_declined_context(shared_state, command)
+        msg = schedule_from_context(shared_state, shared_ui, command)
+        if msg: return jsonify({"status": "uplink_received", "feedback": msg})
         
-        if contextual_appts:
-            shared_state.save_snapshot()
-            time_groups = {}
-            for appt in contextual_appts:
-                t = appt['time']
-                if t not in time_groups: time_groups[t] = []
-                time_groups[t].append(appt['title'])
-            
-            for t, titles in time_groups.items():
-                shared_state.add_appointment(t, " + ".join(titles[:3]), contextual_appts[0]['date'], location='Home')
-            
-            appt_list = "\n  • ".join([f"{a['time']} - {a['title']}" for a in contextual_appts])
-            msg = f"✅ Scheduled {len(contextual_appts)} items from conversation context:\n  • {appt_list}"
-            shared_ui.say(msg)
-            shared_state.chat_history.append({'role': 'assistant', 'content': msg})
-            shared_state.save()
-            return jsonify({"status": "uplink_received", "feedback": msg})
-        
-        threading.Thread(target=shared_router.route_and_execute, args=(command,)).start()
-        return jsonify({"status": "uplink_received"})
+        if not command_queue: return jsonify({"status": "error", "error": "Command queue offline"}), 503
+        try:
+            job = command_queue.submit(command)
+        except QueueFullError as e:
+            return jsonify({"status": "busy", "error": str(e)}), 429, {"Retry-After": "1"}
+        except QueueClosedError as e:
+            return jsonify({"status": "error", "error": str(e)}), 503
+
+        if wait > 0:
+            # Synchronous mode: block (bounded) until the job finishes and return its reply
+            job.wait(timeout=wait)
+            if job.status in ("done", "failed"): return jsonify(job.to_dict()), 200
+
+        body = {"status": "uplink_received", **job.to_dict()}
+        return jsonify(body), 202, {"Location": f"/api/jobs/{job.id}"}
     return jsonify({"status": "error"}), 400
 
+def sse(event_type, data):
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/api/command/stream', methods=['POST'])
+def handle_command_stream():
+    """
+    /api/command with the reply streamed as Server-Sent Events: "queued" (job id),
+    a "token" per piece of the LLM reply as it is generated, then "done" with the
+    same body /api/jobs/<id> returns. The finished reply is logged to chat once.
+    """
+    data = request.json or {}
+    command = data.get("command", "")
+    if not shared_router or not command: return jsonify({"status": "error"}), 400
+    if len(command) > shared_router.internal_safety_net.limits.max_input_length:
+        return jsonify({"status": "error", "error": "Input exceeds screening limit"}), 413
+    cleanup_declined_context(shared_state, command)
+    msg = schedule_from_context(shared_state, shared_ui, command)
+    if msg:
+        done = {"status": "done", "result": {"reply": msg, "messages": [{"kind": "say", "text": msg, "logged": True}]}}
+        return Response(sse("done", done), mimetype="text/event-stream")
+
+    if not command_queue: return jsonify({"status": "error", "error": "Command queue offline"}), 503
+    tokens = queue.Queue()
+    ctx = RequestContext(command, on_token=tokens.put, stream_to_ui=False)
+    try:
+        job = command_queue.submit(ctx, job_id=ctx.request_id)
+    except QueueFullError as e:
+        return jsonify({"status": "busy", "error": str(e)}), 429, {"Retry-After": "1"}
+    except QueueClosedError as e:
+        return jsonify({"status": "error", "error": str(e)}), 503
+
+    heartbeat = (Config.get("events", {}) or {}).get("heartbeat_seconds", 15)
+    def generate():
+        try:
+            yield sse("queued", {"job_id": job.id})
+            idle = 0.0
+            while not job.wait(0):
+                try:
+                    token = tokens.get(timeout=0.1)
+                except queue.Empty:
+                    idle += 0.1
+                    if idle >= heartbeat:
+                        idle = 0.0
+                        yield ": keepalive\n\n"
+                    continue
+                idle = 0.0
+                yield sse("token", {"text": token})
+            while not tokens.empty(): yield sse("token", {"text": tokens.get_nowait()})
+            yield sse("done", job.to_dict())
+        finally:
+            ctx.on_token = None  # Client gone: the command still finishes, tokens are dropped
+    return Response(generate(), mimetype="text/event-stream", headers={"X-Accel-Buffering": "no"})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Poll a queued command. `?wait=N` holds the request up to N seconds (max 30) for it to finish."""
+    job = command_queue.get(job_id) if command_queue else None
+    if not job: return jsonify({"error": "Unknown or expired job"}), 404
+    wait = request.args.get("wait", type=float)
+    if wait: job.wait(timeout=min(wait, 30.0))
+    return jsonify(job.to_dict()), 200
+
+def run_command(router, text, ctx=None):
+    """route_and_execute, then publishes the command's security verdict."""
+    ctx = router.route_and_execute(text, ctx)
+    if event_bus:
+        event_bus.publish("verdict", {"request_id": ctx.request_id, "verdict": ctx.verdict, "text": text[:60]})
+    return ctx
+
+def start_command_queue(router):
+    """Fixed worker pool behind a bounded admission queue for /api/command."""
+    cfg = (Config.get("execution", {}) or {}).get("queue", {}) or {}
+    def run(job):
+        if isinstance(job.payload, RequestContext):  # /api/command/stream brings its own (token sink)
+            return run_command(router, job.payload.text, job.payload)
+        return run_command(router, job.payload, RequestContext(job.payload, request_id=job.id, stream_to_ui=False))
+    return JobQueue(run, workers=cfg.get("workers", 2), max_queue=cfg.get("max_queue", 32),
+                    keep=cfg.get("keep_results", 256), name="command")
+
+def start_event_bus(state):
+    """Event bus for /api/events, fed by every state change."""
+    cfg = Config.get("events", {}) or {}
+    bus = EventBus(capacity=cfg.get("buffer_size", 500), heartbeat=cfg.get("heartbeat_seconds", 15))
+    def on_change(version, ops):
+        for op in ops:
+            if op["key"] == "chat_history" and op["op"] == "append": bus.publish("chat", op["value"])
+        keys = sorted({op["key"] for op in ops}) or list(state.PERSISTED_FIELDS)
+        bus.publish("state", {"version": version, "epoch": state.epoch, "keys": keys})
+        suggestions_wake.set()
+    state.add_listener(on_change)
+    return bus
+
 # --- BACKGROUND SERVICES ---
 
+def suggestion_publisher(state, stop_event):
+    """Pushes proactive suggestions when they change (after state changes, or every 30s as time passes)."""
+    last = None
+    while not stop_event.is_set():
+        suggestions_wake.wait(30)
+        suggestions_wake.clear()
+        suggestions = ContextEngine(state).get_proactive_suggestions()
+        if suggestions != last and event_bus:
+            event_bus.publish("suggestions", {"suggestions": suggestions})
+            last = suggestions
+        time.sleep(0.2)  # Coalesce bursts of changes from one command
+
 def background_monitor(state, stop_event):
     sent_alerts = set()
     while not stop_event.is_set():
         now = datetime.now()
-        cur_time, today = now.strftime("%H:%M"), now.date().isoformat()
-        for appt in list(state.appointments):
-            if appt.get("date") == today and appt['time'] == cur_time:
-                alert_id = f"{appt['title']}_{cur_time}"
-                if alert_id not in sent_alerts:
-                    NotificationService.send(f"⏰ {appt['title']}", title="Jarvis Reminder")
-                    sent_alerts.add(alert_id)
+        # Anything that started within the last minute (the loop wakes every 30s)
+        for at, appt in state.appointments_after(now - timedelta(minutes=1), until=now + timedelta(seconds=1)):
+            alert_id = f"{appt['title']}_{at.isoformat()}"
+            if alert_id not in sent_alerts:
+                NotificationService.send(f"⏰ {appt['title']}", title="Jarvis Reminder")
+                sent_alerts.add(alert_id)
         time.sleep(30)
 
 def run_web_bridge():
@@ -313,13 +547,15 @@ def run_web_bridge():
 # --- MAIN EXECUTION ---
 
 def main():
-    global shared_router, shared_state, shared_ui
+    global shared_router, shared_state, shared_ui, command_queue, event_bus
     print("\n" + "="*60 + "\n🤖 JARVIS INITIALIZATION SEQUENCE\n" + "="*60)
     try:
         Config.load()
         shared_state = JarvisState.load()
         shared_ui = JarvisUI()
         shared_router = JarvisRouter(shared_state, shared_ui)
+        command_queue = start_command_queue(shared_router)
+        event_bus = start_event_bus(shared_state)
         print("✅ Core systems online\n")
     except Exception as e:
         print(f"❌ CRITICAL: {e}"); traceback.print_exc(); return
@@ -335,6 +571,7 @@ def main():
     threading.Thread(target=run_web_bridge, daemon=True).start()
     stop_event = threading.Event()
     threading.Thread(target=background_monitor, args=(shared_state, stop_event), daemon=True).start()
+    threading.Thread(target=suggestion_publisher, args=(shared_state, stop_event), daemon=True).start()
 
     # Network Diagnostics
     try:
@@ -353,8 +590,8 @@ def main():
             user_input = shared_ui.prompt()
             if not user_input or user_input.lower() in ["quit", "exit"]: break
             
-            cleanup_declined_context(shared_state.chat_history, user_input)
-            contextual_appts = extract_schedule_from_context(user_input, shared_state.chat_history)
+            cleanup_declined_context(shared_state, user_input)
+            contextual_appts = extract_schedule_from_context(user_input, shared_state.snapshot()["chat_history"])
             
             if contextual_appts:
                 shared_state.save_snapshot()
@@ -365,14 +602,13 @@ def main():
                 msg = f"✅ Scheduled {len(contextual_appts)} items from conversation context:\n  • {appt_list}"
                 
                 shared_ui.say(msg)
-                shared_state.chat_history.append({'role': 'assistant', 'content': msg})
-                shared_state.save()
+                shared_state.log_chat('assistant', msg)
             else:
-                shared_router.route_and_execute(user_input)
+                run_command(shared_router, user_input)
         except KeyboardInterrupt: break
         except Exception as e: shared_ui.error(f"Kernel Error: {e}"); traceback.print_exc()
 
-    print("\n🔴 Initiating shutdown..."); stop_event.set(); shared_state.save()
+    print("\n🔴 Initiating shutdown..."); stop_event.set(); command_queue.close(wait=True); event_bus.close(); shared_state.save(); shared_state.close()
     shared_ui.say("Standing by. Sleep well, Master."); print("✨ Offline.\n")
 
 if __name__ == "__main__":
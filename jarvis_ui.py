@@ -23,6 +23,27 @@ class JarvisUI:
         if state:
             state.log_chat("assistant", text)
 
+    def stream(self, token, first=False):
+        """Prints a reply token by token as the LLM produces it; end_stream() finishes the line."""
+        if first:
+            print(f"\n{self.BOT_TAG} ", end="")
+            self._held = ""
+        # Trailing whitespace waits for the next token, as the final reply is stripped
+        text = self._held + token
+        shown = text.rstrip()
+        self._held = text[len(shown):]
+        print(shown, end="", flush=True)
+
+    def end_stream(self, text, streamed, state=None):
+        """Completes a streamed reply: prints only what the final text adds, or all of it if it differs."""
+        shown = streamed.rstrip()
+        if not text.startswith(shown):
+            print()
+            return self.say(text, state)
+        print(re.sub(r'\*\*(.*?)\*\*', f'{self.BOLD}\\1{self.END}', text[len(shown):]))
+        if state:
+            state.log_chat("assistant", text)
+
     def system(self, text):
         print(f"\n⚙️ SYSTEM › {text}")
 
@@ -3,14 +3,21 @@ import random
 from skills.weather import WeatherSkill
 from jarvis_core import Config
 
+try:
+    from core.intent_index import IntentIndex
+except ImportError:
+    from intent_index import IntentIndex
+
 class BriefingSkill:
+    TRIGGERS = [{"contains": ["briefing", "good morning", "summary"]}]
+
     def __init__(self, state, ui):
         self.state = state
         self.ui = ui
         self.weather = WeatherSkill(state, ui)
 
     def match(self, text):
-        return any(w in text.lower() for w in ["briefing", "good morning", "summary"])
+        return IntentIndex.matches(self, text)
 
     def execute(self, text=None):
         now = datetime.now()
@@ -22,8 +29,7 @@ class BriefingSkill:
         lines.append("-" * 40)
         
         today_iso = now.date().isoformat()
-        todays_appts = [a for a in self.state.appointments if a.get("date") == today_iso]
-        todays_appts.sort(key=lambda x: x['time'])
+        todays_appts = self.state.appointments_on(today_iso)
         
         if todays_appts:
             lines.append(f"📅 **Today's Schedule ({len(todays_appts)} events):**")
@@ -1,10 +1,16 @@
 import json
-import urllib.request
 import time
 import re
 from datetime import datetime
 from typing import List, Dict, Optional, Any
 
+try:
+    from core.tracing import span
+    from core.http_client import HTTPStatusError
+except ImportError:
+    from tracing import span
+    from http_client import HTTPStatusError
+
 # Dummy classes for type hinting if core modules aren't available
 class TherapyEngine:
     def __init__(self, state): pass
@@ -27,44 +33,58 @@ class ConversationSkill:
         self.humor = humor_module
         
         # Local Llama configuration
-        from jarvis_core import Config
+        from jarvis_core import Config, http_client
+        self.http = http_client()
         self.ollama_url = Config.get("ollama_url", "http://localhost:11434")
         self.model = Config.get("ollama_model", "llama3.2")
+        self.streaming = Config.get("stream_replies", True)  # Show tokens as Ollama produces them
+        self.llm_stage = None  # Router-assigned limiter capping concurrent LLM calls
 
     def match(self, text):
         return True  # Chat is fallback
 
     def execute(self, text: str):
         """Processes conversation with anti-hallucination measures and prints output for core logging."""
+        turn = self.prepare(text)
+        self.finish(turn, self.generate(turn, on_token=self.token_sink()))
+
+    def token_sink(self):
+        """Where streamed tokens go (the UI's stream()), or None when streaming is off."""
+        return getattr(self.ui, "stream", None) if self.streaming else None
+
+    def prepare(self, text: str) -> Dict[str, Any]:
+        """
+        Steps 1-5: builds the prompt without touching state, so the router may
+        run generate() on it speculatively before the security verdict.
+        Everything with side effects waits for finish().
+        """
         
-        # 1. Therapy Analysis (if engine available)
-        if self.therapy:
-            self.therapy.analyze(text)
-        
-        # 2. Anti-Hallucination: Reset on incoherent responses
-        if len(self.state.chat_history) > 0:
-            last_msg = self.state.chat_history[-1]
+        # 1. Anti-Hallucination: the prompt sees history as finish() will trim it
+        history = self.state.chat_history
+        reset_history = False
+        if len(history) > 0:
+            last_msg = history[-1]
             last_response = last_msg.get('content', '') if last_msg.get('role') == 'assistant' else ''
             
             # Detect incoherent markers or repetitive weather hallucinations
             hallucination_markers = ['it is clear today', "it's still clear outside", 'your current situation']
             if any(marker in last_response.lower() for marker in hallucination_markers):
-                print("⚠️ Detected incoherent response - clearing recent history")
+                reset_history = True
                 # Keep only last 2 exchanges (4 messages: 2 user, 2 assistant)
-                self.state.chat_history = self.state.chat_history[-4:]
+                history = history[-4:]
 
-        # 3. Pinned Context logic
+        # 2. Pinned Context logic
         now = datetime.now()
         today_iso = now.date().isoformat()
         pinned = ""
         if self.state.last_focus == "schedule":
-            appts = [f"{a['time']} - {a['title']}" for a in self.state.appointments if a.get("date") == today_iso]
+            appts = [f"{a['time']} - {a['title']}" for a in self.state.appointments_on(today_iso)]
             pinned = f"AGENDA: {', '.join(appts) if appts else 'No events.'}"
         else:
-            tasks = [t['text'] for t in self.state.task_memory if not t.get('completed')]
+            tasks = [t['text'] for t in self.state.open_tasks()]
             pinned = f"TASKS: {', '.join(tasks) if tasks else 'No pending tasks.'}"
 
-        # 4. Construct System Prompt
+        # 3. Construct System Prompt
         therapy_context = self.therapy.get_prompt_context() if self.therapy else ""
         system_prompt = (
             f"You are Jarvis, a sophisticated AI butler assistant. {therapy_context}\n"
@@ -79,13 +99,42 @@ class ConversationSkill:
         elif self.state.settings.get("mood") == "Concise":
             system_prompt += "\n[Tone Mode: Concise. Be brief and direct.]"
 
-        # 5. Build History
+        # 4. Build History
         if self.context_engine:
-            working_history = self.context_engine.get_cleaned_history(max_messages=12)
+            working_history = self.context_engine.get_cleaned_history(max_messages=12, history=history)
         else:
-            working_history = self.state.chat_history[-12:]
+            working_history = history[-12:]
+
+        return {"text": text, "system_prompt": system_prompt, "history": working_history,
+                "reset_history": reset_history}
+
+    def generate(self, turn: Dict[str, Any], cancel=None, on_token=None) -> Optional[str]:
+        """
+        5. Call LLM. Returns None if `cancel` (threading.Event) is set before the reply completes.
+        `on_token` is called with each piece of the reply as it arrives.
+        """
+        if self.llm_stage is None:
+            with span("llm"):
+                return self._call_llama(turn["system_prompt"], turn["history"], turn["text"], cancel=cancel, on_token=on_token)
+        with self.llm_stage:
+            if cancel is not None and cancel.is_set(): return None
+            with span("llm"):
+                return self._call_llama(turn["system_prompt"], turn["history"], turn["text"], cancel=cancel, on_token=on_token)
 
-        # 6. Evaluate Wit (if module available)
+    def finish(self, turn: Dict[str, Any], response_text: Optional[str]):
+        """6-9. Personality updates, then Final Polish & Output. Only runs once the turn has cleared security."""
+        text = turn["text"]
+
+        # 6. Therapy Analysis (if engine available)
+        if self.therapy:
+            self.therapy.analyze(text)
+
+        # 7. Anti-Hallucination: Reset on incoherent responses
+        if turn["reset_history"]:
+            print("⚠️ Detected incoherent response - clearing recent history")
+            self.state.set_field("chat_history", self.state.chat_history[-4:])
+
+        # 8. Evaluate Wit (if module available)
         is_joke = False
         signal = ""
         if self.humor:
@@ -97,10 +146,7 @@ class ConversationSkill:
             except Exception:
                 pass
 
-        # 7. Call LLM
-        response_text = self._call_llama(system_prompt, working_history, text)
-
-        # 8. Final Polish & Output
+        # 9. Final Polish & Output
         if response_text:
             # Inject humor response if detected
             if is_joke and self.humor and hasattr(self.humor, 'get_personality_response'):
@@ -116,8 +162,14 @@ class ConversationSkill:
             # ✅ Print only (let _execute_with_logging in core handle chat_history)
             self.ui.say(response_text)
 
-    def _call_llama(self, sys_prompt: str, history: List[Dict], user_text: str) -> str:
-        """Call local Llama 3.1 via Ollama generate API"""
+    def _call_llama(self, sys_prompt: str, history: List[Dict], user_text: str, cancel=None, on_token=None) -> Optional[str]:
+        """
+        Call local Llama 3.1 via Ollama generate API.
+        With a `cancel` event or an `on_token` callback the reply is streamed
+        (Ollama's NDJSON chunks): generation can be abandoned mid-way, since
+        closing the connection stops Ollama from finishing it, and each chunk
+        is handed to `on_token` as it arrives. The full reply is still returned.
+        """
         url = f"{self.ollama_url}/api/generate"
         
         # Build the full prompt with system instruction and history
@@ -139,7 +191,7 @@ class ConversationSkill:
         payload = {
             "model": self.model,
             "prompt": full_prompt,
-            "stream": False,
+            "stream": cancel is not None or on_token is not None,
             "options": {
                 "temperature": 0.7,
                 "num_predict": 400,
@@ -149,27 +201,35 @@ class ConversationSkill:
         }
 
         try:
-            req = urllib.request.Request(
-                url, 
-                data=json.dumps(payload).encode('utf-8'),
-                headers={'Content-Type': 'application/json'},
-                method='POST'
-            )
-            
-            with urllib.request.urlopen(req, timeout=60) as res:
-                result = json.loads(res.read().decode('utf-8'))
-                response = result.get('response', '').strip()
+            body = json.dumps(payload).encode('utf-8')
+            timeout = self.http.timeout("ollama", 60)
+            # Generating twice only costs time, so failed calls may be retried
+            with self.http.post(url, body, headers={'Content-Type': 'application/json'}, timeout=timeout, idempotent=True) as res:
+                if not payload["stream"]:
+                    result = json.loads(res.read().decode('utf-8'))
+                    response = result.get('response', '').strip()
+                else:
+                    # Read to the end of the stream (past the "done" chunk) so the connection is reused
+                    parts = []
+                    for line in res:
+                        if cancel is not None and cancel.is_set(): return None
+                        if not line.strip(): continue
+                        chunk = json.loads(line.decode('utf-8'))
+                        piece = chunk.get('response', '')
+                        parts.append(piece)
+                        if on_token and piece: on_token(piece)
+                    response = "".join(parts).strip()
                 
                 # Clean up any remaining artifacts
                 response = response.replace("Jarvis:", "").strip()
                 
                 return response if response else "I apologize, sir. I'm having difficulty formulating a response."
                 
-        except urllib.error.HTTPError as e:
-            error_body = e.read().decode('utf-8')
+        except HTTPStatusError as e:
+            error_body = e.body.decode('utf-8', errors='replace')
             print(f"❌ Ollama HTTP {e.code}: {error_body}")
             return "I apologize, sir. My neural processor encountered an error."
-        except urllib.error.URLError as e:
+        except OSError as e:
             print(f"❌ Ollama connection error: {e}")
             return "I apologize, sir. My neural processor is offline. Please ensure Ollama is running."
         except Exception as e:
@@ -2,7 +2,15 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from datetime import datetime, timedelta
 import re
 
+try:
+    from core.intent_index import IntentIndex
+except ImportError:
+    from intent_index import IntentIndex
+
 class NotificationSkill:
+    # Both immediate and delayed notifications
+    TRIGGERS = [{"contains": ["ping me", "remind me", "notification in", "alert me", "notify me"]}]
+
     def __init__(self, state, ui):
         self.state = state
         self.ui = ui
@@ -10,11 +18,7 @@ class NotificationSkill:
         self.scheduler.start()
         
     def match(self, text):
-        low = text.lower()
-        # Match both immediate and delayed notifications
-        return any(phrase in low for phrase in [
-            "ping me", "remind me", "notification in", "alert me", "notify me"
-        ])
+        return IntentIndex.matches(self, text)
 
     def execute(self, text):
         # Import here to avoid circular dependency
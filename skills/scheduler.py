@@ -1,7 +1,21 @@
 import re
 from datetime import datetime, timedelta
 
+try:
+    from core.intent_index import IntentIndex
+except ImportError:
+    from intent_index import IntentIndex
+
 class SchedulerSkill:
+    # Routing triggers (compiled by the router's IntentIndex)
+    TRIGGERS = [
+        {"contains": ["schedule", "agenda", "calendar", "clear", "week", "upcoming"]},
+        {"contains": ["delete", "remove"], "and_contains": ["event", "appointment", "schedule"]},
+        # Numerical deletes if focus is already schedule
+        {"regex": r"^(delete|remove|done|complete|finish)\s+\d+$", "focus": "schedule"},
+        {"regex": r"\b([0-9]{1,2}):?([0-9]{2})?\s*(am|pm)?\b"}
+    ]
+
     def __init__(self, state, ui):
         self.state = state
         self.ui = ui
@@ -9,13 +23,7 @@ class SchedulerSkill:
         self.WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
 
     def match(self, text):
-        low = text.lower()
-        if any(t in low for t in ["schedule", "agenda", "calendar", "clear", "week", "upcoming"]): return True
-        if ("delete" in low or "remove" in low) and any(x in low for x in ["event", "appointment", "schedule"]): return True
-        # Catch numerical deletes if focus is already schedule
-        if self.state.last_focus == "schedule" and re.match(r"^(delete|remove|done|complete|finish)\s+\d+$", low):
-            return True
-        return self.TIME_RE.search(text) is not None
+        return IntentIndex.matches(self, text)
 
     def execute(self, text):
         low = text.lower()
@@ -60,17 +68,8 @@ class SchedulerSkill:
             start_date = today
             end_date = today + timedelta(days=7)
             
-            # Find all appointments in the next 7 days
-            upcoming = []
-            for a in self.state.appointments:
-                try:
-                    appt_date = datetime.fromisoformat(a.get("date")).date()
-                    if start_date <= appt_date <= end_date:
-                        upcoming.append(a)
-                except ValueError:
-                    continue
-            
-            upcoming.sort(key=lambda x: (x['date'], x['time']))
+            # Find all appointments in the next 7 days (already ordered by date and time)
+            upcoming = self.state.appointments_between(start_date.isoformat(), end_date.isoformat())
             self.state.view_buffer = list(upcoming)
             
             if not upcoming:
@@ -91,7 +90,7 @@ class SchedulerSkill:
         # --- SINGLE DAY VIEW LOGIC ---
         d_iso = self._get_iso_date(text)
         # Filter and sort
-        appts = sorted([a for a in self.state.appointments if a.get("date") == d_iso], key=lambda x: x['time'])
+        appts = self.state.appointments_on(d_iso)
         
         # POPULATE VIEW BUFFER: This allows "delete 1" to work relative to this specific list
         self.state.view_buffer = list(appts)
@@ -115,7 +114,7 @@ class SchedulerSkill:
             else:
                 # Fallback to current day if no buffer exists
                 d_iso = self._get_iso_date(text)
-                items = sorted([a for a in self.state.appointments if a.get("date") == d_iso], key=lambda x: x['time'])
+                items = self.state.appointments_on(d_iso)
             
             if 0 <= idx < len(items):
                 to_remove = items[idx]
@@ -130,10 +129,7 @@ class SchedulerSkill:
 
     def _handle_clear(self, text):
         d_iso = self._get_iso_date(text)
-        original_count = len(self.state.appointments)
-        self.state.appointments = [a for a in self.state.appointments if a.get("date") != d_iso]
-        if len(self.state.appointments) < original_count:
-            self.state.save()
+        if self.state.remove_where("appointments", lambda a: a.get("date") != d_iso):
             self.state.view_buffer = []
             self.ui.success(f"Schedule for {d_iso} has been wiped.")
         else:
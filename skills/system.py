@@ -1,11 +1,17 @@
+try:
+    from core.intent_index import IntentIndex
+except ImportError:
+    from intent_index import IntentIndex
+
 class SystemSkill:
+    TRIGGERS = [{"equals": ["status", "quit", "exit", "debug state", "undo", "reset", "clear chat"]}]
+
     def __init__(self, state, ui):
         self.state = state
         self.ui = ui
 
     def match(self, text):
-        low = text.lower().strip()
-        return low in ["status", "quit", "exit", "debug state", "undo", "reset", "clear chat"]
+        return IntentIndex.matches(self, text)
 
     def execute(self, text):
         low = text.lower().strip()
@@ -20,8 +26,7 @@ class SystemSkill:
             return
             
         if low in ["reset", "clear chat"]:
-            self.state.chat_history = []
-            self.state.save()
+            self.state.set_field("chat_history", [])
             self.ui.success("Conversation history wiped. I am ready for new instructions.")
             return
         
@@ -1,37 +1,29 @@
 import re
 
+try:
+    from core.intent_index import IntentIndex
+except ImportError:
+    from intent_index import IntentIndex
+
 class TaskSkill:
+    # Routing triggers (compiled by the router's IntentIndex)
+    TRIGGERS = [
+        # 1. Explicit task-related keywords
+        {"contains": ["task", "to do", "todo", "list"]},
+        # 2. Match "delete 1", "done 2", etc.
+        {"regex": r"^(delete|remove|done|complete|finish)\s+\d+$"},
+        # 3. "add ..." unless it carries scheduling keywords or a time ("at 3", "3pm", "14:30")
+        {"regex": r"^add ",
+         "unless_contains": ["schedule", "calendar", "event", "tomorrow", "today"],
+         "unless_regex": r"at \d|\b\d{1,2}(?::\d{2})?\s*(?:am|pm)\b|\b\d{1,2}:\d{2}\b"}
+    ]
+
     def __init__(self, state, ui):
         self.state = state
         self.ui = ui
 
     def match(self, text):
-        low = text.lower()
-        
-        # 1. Explicit task-related keywords
-        if any(w in low for w in ["task", "to do", "todo", "list"]): 
-            return True
-            
-        # 2. Match "delete 1", "done 2", etc.
-        if re.match(r"^(delete|remove|done|complete|finish)\s+\d+$", low): 
-            return True
-            
-        # 3. Handle "add ..." with exclusion logic for the scheduler
-        if low.startswith("add "):
-            # Exclude explicit scheduling keywords
-            if any(x in low for x in ["schedule", "calendar", "event", "tomorrow", "today"]):
-                return False
-            
-            # Exclude specific time patterns (e.g., "at 3", "3pm", "14:30")
-            # We look for "at " followed by a digit, or time-specific formats
-            if "at " in low and re.search(r"at \d", low):
-                return False
-            if re.search(r"\b\d{1,2}(?::\d{2})?\s*(?:am|pm)\b|\b\d{1,2}:\d{2}\b", low, re.I):
-                return False
-                
-            return True
-            
-        return False
+        return IntentIndex.matches(self, text)
 
     def execute(self, text):
         low = text.lower()
@@ -1,14 +1,20 @@
-import urllib.request
 import json
-from jarvis_core import Config
+from jarvis_core import Config, http_client
+
+try:
+    from core.intent_index import IntentIndex
+except ImportError:
+    from intent_index import IntentIndex
 
 class WeatherSkill:
+    TRIGGERS = [{"contains": ["weather"]}]
+
     def __init__(self, state, ui):
         self.state = state
         self.ui = ui
 
     def match(self, text):
-        return "weather" in text.lower()
+        return IntentIndex.matches(self, text)
 
     def get_weather(self, city=None):
         # Priority: Method argument > Config file > Default
@@ -17,7 +23,8 @@ class WeatherSkill:
         try:
             # Using wttr.in for a simple, no-key-required weather check
             url = f"https://wttr.in/{search_city}?format=%C+|+%t"
-            with urllib.request.urlopen(url, timeout=5) as response:
+            client = http_client()
+            with client.get(url, timeout=client.timeout("weather", 5)) as response:
                 condition_temp = response.read().decode('utf-8').strip()
                 return f"Weather: {search_city.capitalize()}: {condition_temp}"
         except Exception: